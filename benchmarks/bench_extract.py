@@ -0,0 +1,158 @@
+import os
+import sys
+import gc
+import csv
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from process import DataProcessorAll, CSVManagerALl, mode_columns
+
+"""
+Micro-benchmark: per-row cost of turning raw 'ALL' responses into CSV lines.
+
+Compares the previous dict-based path (one ~50-key dict per listing with repeated
+`.get()` chains, then a filtered copy through csv.DictWriter) against the compiled
+table-driven extractor producing tuples for csv.writer. Output goes to os.devnull.
+
+Usage:
+    python benchmarks/bench_extract.py [rows]   (default 200000)
+"""
+
+
+def synthetic_announcement(i):
+    return {
+        "id": str(i), "reference": f"r{i}", "title": f"Listing {i}", "slug": f"listing-{i}",
+        "description": "Lorem ipsum dolor sit amet " * 8, "createdAt": "2026-01-01T00:00:00",
+        "status": "PUBLISHED", "street_name": None,
+        "price": 1500000 + i, "pricePreview": 1500000 + i, "oldPrice": None, "oldPricePreview": None,
+        "priceType": "FIXED", "priceUnit": "DA", "exchangeType": None,
+        "hasDelivery": False, "deliveryType": None, "hasPhone": True, "hasEmail": False, "quantity": 1,
+        "category": {"id": "1", "name": "Automobiles", "slug": "automobiles"},
+        "cities": [{"id": "16", "name": "Alger", "region": {"id": "16", "name": "Alger"}}],
+        "user": {"id": str(i % 997), "username": f"user{i % 997}", "displayName": "User", "avatarUrl": None},
+        "isFromStore": i % 4 == 0,
+        "store": {"id": "7", "name": "Store", "slug": "store", "description": "", "imageUrl": None,
+                  "followerCount": 10, "announcementsCount": 100, "status": "ACTIVE"} if i % 4 == 0 else None,
+        "defaultMedia": {"mediaUrl": f"https://cdn.example/{i}.jpg", "mimeType": "image/jpeg"},
+        "medias": [{"mediaUrl": f"https://cdn.example/{i}_{j}.jpg"} for j in range(4)],
+        "isCommentEnabled": True, "noAdsense": False, "orderExternalUrl": None,
+        "messengerLink": None, "showAnalytics": False, "variants": [],
+        "specs": [
+            {"specification": {"label": "Kilométrage", "codename": "km"}, "valueText": [str(i * 10)]},
+            {"specification": {"label": "Année", "codename": "year"}, "valueText": ["2019"]},
+            {"specification": {"label": "Couleur", "codename": "color"}, "valueText": []},
+        ],
+    }
+
+
+def legacy_process_all(raw_data, all_spec_labels=None):
+    """
+    The DataProcessorAll mapping as it was before the column table (kept as the baseline).
+    """
+    processed_data = {
+        "id": raw_data.get("id"), "reference": raw_data.get("reference"), "title": raw_data.get("title"),
+        "slug": raw_data.get("slug"), "description": raw_data.get("description"),
+        "creation_date": raw_data.get("createdAt"), "status": raw_data.get("status"),
+        "street_name": raw_data.get("street_name"),
+        "price": raw_data.get("price"), "price_preview": raw_data.get("pricePreview"),
+        "old_price": raw_data.get("oldPrice"), "old_price_preview": raw_data.get("oldPricePreview"),
+        "price_type": raw_data.get("priceType"), "price_unit": raw_data.get("priceUnit"),
+        "exchange_type": raw_data.get("exchangeType"),
+        "has_delivery": raw_data.get("hasDelivery"), "delivery_type": raw_data.get("deliveryType"),
+        "has_phone": raw_data.get("hasPhone"), "has_email": raw_data.get("hasEmail"),
+        "quantity": raw_data.get("quantity"),
+        "category_id": raw_data.get("category", {}).get("id") if raw_data.get("category") else None,
+        "category_name": raw_data.get("category", {}).get("name") if raw_data.get("category") else None,
+        "category_slug": raw_data.get("category", {}).get("slug") if raw_data.get("category") else None,
+        "city": None, "city_id": None, "region": None, "region_id": None,
+        "user_id": raw_data.get("user", {}).get("id") if raw_data.get("user") else None,
+        "username": raw_data.get("user", {}).get("username") if raw_data.get("user") else None,
+        "user_display_name": raw_data.get("user", {}).get("displayName") if raw_data.get("user") else None,
+        "avatar_url": raw_data.get("user", {}).get("avatarUrl") if raw_data.get("user") else None,
+        "is_from_store": raw_data.get("isFromStore"),
+        "store_id": None, "store_name": None, "store_slug": None, "store_description": None,
+        "store_image_url": None, "store_follower_count": None, "store_announcements_count": None,
+        "store_status": None,
+        "default_media_url": None, "default_media_type": None, "media_count": 0,
+        "is_comment_enabled": raw_data.get("isCommentEnabled"), "no_adsense": raw_data.get("noAdsense"),
+        "external_url": raw_data.get("orderExternalUrl"), "messenger_link": raw_data.get("messengerLink"),
+        "show_analytics": raw_data.get("showAnalytics"), "variants_count": 0
+    }
+    if raw_data.get("cities") and len(raw_data["cities"]) > 0:
+        city_data = raw_data["cities"][0]
+        processed_data["city"] = city_data.get("name")
+        processed_data["city_id"] = city_data.get("id")
+        if city_data.get("region"):
+            processed_data["region"] = city_data["region"].get("name")
+            processed_data["region_id"] = city_data["region"].get("id")
+    if raw_data.get("store"):
+        store_data = raw_data["store"]
+        processed_data["store_id"] = store_data.get("id")
+        processed_data["store_name"] = store_data.get("name")
+        processed_data["store_slug"] = store_data.get("slug")
+        processed_data["store_description"] = store_data.get("description")
+        processed_data["store_image_url"] = store_data.get("imageUrl")
+        processed_data["store_follower_count"] = store_data.get("followerCount")
+        processed_data["store_announcements_count"] = store_data.get("announcementsCount")
+        processed_data["store_status"] = store_data.get("status")
+    if raw_data.get("defaultMedia"):
+        processed_data["default_media_url"] = raw_data["defaultMedia"].get("mediaUrl")
+        processed_data["default_media_type"] = raw_data["defaultMedia"].get("mimeType")
+    if raw_data.get("medias"):
+        processed_data["media_count"] = len(raw_data["medias"])
+    if raw_data.get("variants"):
+        processed_data["variants_count"] = len(raw_data["variants"])
+    if all_spec_labels:
+        for label in all_spec_labels:
+            processed_data[f"spec_{label}"] = None
+    if raw_data.get("specs"):
+        for spec in raw_data["specs"]:
+            label = spec["specification"]["label"]
+            value = spec["valueText"][0] if spec["valueText"] else None
+            processed_data[f"spec_{label}"] = value
+    return processed_data
+
+
+def run_legacy(batch, spec_labels):
+    fieldnames = mode_columns("ALL") + [f"spec_{label}" for label in sorted(spec_labels)]
+    start = time.perf_counter()
+    rows = [legacy_process_all(raw_data) for raw_data in batch]
+    extracted = time.perf_counter()
+    with open(os.devnull, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        for data in rows:
+            writer.writerow({k: v for k, v in data.items() if k in fieldnames})
+    return extracted - start, time.perf_counter() - extracted
+
+
+def run_compiled(batch, spec_labels):
+    processor = DataProcessorAll()
+    csv_manager = CSVManagerALl(os.devnull, spec_labels)
+    start = time.perf_counter()
+    rows = [processor.process_row(raw_data) for raw_data in batch]
+    extracted = time.perf_counter()
+    csv_manager.open()
+    csv_manager.write_rows(rows)
+    csv_manager.close()
+    return extracted - start, time.perf_counter() - extracted
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    print(f"Building {count} synthetic announcements...")
+    batch = [synthetic_announcement(i) for i in range(count)]
+    spec_labels = DataProcessorAll().collect_all_specs(batch)
+
+    # Like timeit, keep the collector out of the timings (the batch itself is a huge heap)
+    gc.disable()
+    results = {"dict + DictWriter": run_legacy(batch, spec_labels),
+               "compiled + csv.writer": run_compiled(batch, spec_labels)}
+    gc.enable()
+
+    print(f"{'path':<24}{'extract us/row':>16}{'write us/row':>14}{'total us/row':>14}")
+    for name, (extract, write) in results.items():
+        print(f"{name:<24}{extract / count * 1e6:>16.2f}{write / count * 1e6:>14.2f}{(extract + write) / count * 1e6:>14.2f}")
+
+    before, after = (sum(timings) for timings in results.values())
+    print(f"Speed-up: {before / after:.2f}x")
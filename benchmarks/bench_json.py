@@ -0,0 +1,79 @@
+import os
+import sys
+import gc
+import json
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from settings import TYPE, BATCH_SIZE
+from fetch_api import ANNOUNCEMENT_FIELDS
+from utils import get_payload_post_batch
+from json_backend import STDLIB, ORJSON, backend
+from stand_in_server import StandInServer
+
+"""
+Micro-benchmark: JSON cost of API responses, per backend.
+
+Builds batched detail responses shaped by the TYPE mode query with the StandInServer,
+then times decoding them the previous way (`response.json()`, which guesses the
+encoding and decodes a text copy first) against each json_backend implementation
+decoding the raw bytes. Encoding (journal / raw cache) is timed too.
+
+Usage:
+    python benchmarks/bench_json.py [responses]   (default 2000)
+"""
+
+
+def build_responses(count):
+    server = StandInServer(total=count * BATCH_SIZE)
+    query = get_payload_post_batch([0] * BATCH_SIZE, ANNOUNCEMENT_FIELDS)["query"]
+    bodies = []
+    for i in range(count):
+        ids = server.ids[i * BATCH_SIZE:(i + 1) * BATCH_SIZE]
+        body = server.details({f"id{j}": str(ann_id) for j, ann_id in enumerate(ids)}, query)
+        bodies.append(json.dumps(body, ensure_ascii=False).encode("utf-8"))
+    return bodies
+
+
+def as_response(content):
+    response = requests.Response()
+    response._content = content
+    response.status_code = 200
+    return response
+
+
+def timed(func, items):
+    start = time.perf_counter()
+    for item in items:
+        func(item)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    print(f"Building {count} responses ({TYPE} mode, batches of {BATCH_SIZE})...")
+    bodies = build_responses(count)
+    megabytes = sum(len(body) for body in bodies) / 1e6
+    decoded = [STDLIB.loads(body) for body in bodies]
+    responses = [as_response(body) for body in bodies]
+    print(f"{megabytes:.1f} MB, {megabytes * 1e6 / count / 1024:.1f} KB per response on average")
+
+    gc.disable()
+    results = {"requests .json()": (timed(lambda response: response.json(), responses), None)}
+    for candidate in (STDLIB, ORJSON):
+        if candidate is None:
+            print("orjson is not installed (pip install orjson); skipping it.")
+            continue
+        results[candidate.name] = (timed(candidate.loads, bodies), timed(candidate.dumps_bytes, decoded))
+    gc.enable()
+
+    print(f"{'decoder':<18}{'decode ms/MB':>14}{'MB/s':>10}{'us/response':>13}{'encode ms/MB':>14}")
+    for name, (decode, encode) in results.items():
+        encode_column = f"{encode / megabytes * 1e3:>14.2f}" if encode is not None else f"{'-':>14}"
+        print(f"{name:<18}{decode / megabytes * 1e3:>14.2f}{megabytes / decode:>10.1f}"
+              f"{decode / count * 1e6:>13.1f}{encode_column}")
+
+    baseline = results["requests .json()"][0]
+    print(f"Active backend: {backend.name}, decode speed-up vs. response.json(): {baseline / results[backend.name][0]:.2f}x")
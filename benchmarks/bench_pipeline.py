@@ -0,0 +1,216 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from settings import TYPE, MAX_WORKERS, BATCH_SIZE, MEDIA_WORKERS, POOL_CONNECTIONS, POOL_MAXSIZE
+from fetch_api import OuedKnissAPI
+from downloader import MediaDownloadPool
+from http_session import HTTPSession
+from rate_limit import RateLimiter
+from scraper import CSVManager, DataProcessor
+from metrics import metrics
+from log import setup_logging
+from stand_in_server import StandInServer
+
+"""
+Offline Pipeline Benchmark.
+Runs the real fetch_api / downloader / process code against a local StandInServer
+and times each stage separately: ID scanning, detail fetching, image downloading,
+processing and CSV export. Results are written as a JSON report; passing a previous
+report as --baseline flags stages whose throughput dropped beyond --tolerance.
+
+Usage:
+    python benchmarks/bench_pipeline.py --listings 3000 --latency 0.02 --throttle-rate 0.02
+    python benchmarks/bench_pipeline.py --baseline bench_report.json
+    python benchmarks/bench_pipeline.py --persisted-queries
+    python benchmarks/bench_pipeline.py --refresh-rate 2 --removal-rate 1 --snapshot-scan
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the scraper against a local stand-in API.")
+    server = parser.add_argument_group("stand-in server")
+    server.add_argument("--listings", type=int, default=3000, help="listings in the fake category")
+    server.add_argument("--latency", type=float, default=0.02, help="seconds added to every response")
+    server.add_argument("--jitter", type=float, default=0.0, help="extra random latency, up to this many seconds")
+    server.add_argument("--error-rate", type=float, default=0.0, help="share of HTTP 500 responses")
+    server.add_argument("--throttle-rate", type=float, default=0.0, help="share of HTTP 429 responses")
+    server.add_argument("--retry-after", type=int, default=1, help="Retry-After sent with 429 responses")
+    server.add_argument("--specs", type=int, default=8, help="specifications per listing")
+    server.add_argument("--media", type=int, default=3, help="images per listing")
+    server.add_argument("--description-bytes", type=int, default=600, help="description length per listing")
+    server.add_argument("--image-kb", type=int, default=50, help="size of each image")
+    server.add_argument("--refresh-rate", type=float, default=0.0, help="listings moved to the top per search request")
+    server.add_argument("--removal-rate", type=float, default=0.0, help="listings removed per search request")
+
+    client = parser.add_argument_group("scraper")
+    client.add_argument("--pages", type=int, default=None, help="max search pages to scan (default: all)")
+    client.add_argument("--sequential-scan", action="store_true", help="scan pages sequentially instead of in parallel")
+    client.add_argument("--snapshot-scan", action="store_true", help="sequential scan with page drift detection")
+    client.add_argument("--rps", type=float, default=0, help="API requests per second (0 = unlimited)")
+    client.add_argument("--media-rps", type=float, default=0, help="CDN requests per second (0 = unlimited)")
+    client.add_argument("--workers", type=int, default=MAX_WORKERS, help="concurrent detail requests")
+    client.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="IDs per detail request")
+    client.add_argument("--media-workers", type=int, default=MEDIA_WORKERS, help="image download workers")
+    client.add_argument("--media-listings", type=int, default=200, help="listings whose images are downloaded")
+    client.add_argument("--persisted-queries", action="store_true", help="send query hashes instead of query texts")
+
+    output = parser.add_argument_group("report")
+    output.add_argument("--report", default="bench_report.json", help="where to write the JSON report")
+    output.add_argument("--baseline", default=None, help="previous report to compare against")
+    output.add_argument("--tolerance", type=float, default=0.2, help="allowed throughput drop vs. baseline (0.2 = 20%%)")
+    output.add_argument("--keep-files", action="store_true", help="keep downloaded images and the CSV")
+    output.add_argument("--verbose", action="store_true", help="show the scraper's own log output (DEBUG level)")
+    return parser.parse_args()
+
+
+def timed_stage(stages, name, func):
+    """
+    Runs one stage and records its timing.
+    `func` returns (result, items processed, items failed).
+    """
+    start = time.perf_counter()
+    result, items, failed = func()
+    seconds = time.perf_counter() - start
+
+    stages[name] = {
+        "seconds": round(seconds, 4),
+        "items": items,
+        "failed": failed,
+        "items_per_second": round(items / seconds, 2) if seconds else None,
+    }
+    print(f"{name:<10} {items:>7} items {failed:>5} failed {seconds:>9.3f}s {stages[name]['items_per_second'] or 0:>10.1f}/s")
+    return result
+
+
+def compare(report, baseline_file, tolerance):
+    """
+    Lists the stages whose throughput fell by more than `tolerance` against a baseline report.
+    """
+    with open(baseline_file, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    regressions = []
+    for name, stage in report["stages"].items():
+        before = baseline.get("stages", {}).get(name, {}).get("items_per_second")
+        after = stage["items_per_second"]
+        if before and after is not None and after < before * (1 - tolerance):
+            regressions.append({"stage": name, "baseline": before, "current": after,
+                                "change": round(after / before - 1, 3)})
+    return regressions
+
+
+def run(args):
+    server = StandInServer(total=args.listings, latency=args.latency, jitter=args.jitter,
+                           error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+                           retry_after=args.retry_after, spec_count=args.specs, media_count=args.media,
+                           description_bytes=args.description_bytes, image_bytes=args.image_kb * 1024,
+                           refresh_rate=args.refresh_rate, removal_rate=args.removal_rate)
+    url = server.start()
+    setup_logging("DEBUG" if args.verbose else "ERROR")
+    metrics.reset()
+    session = HTTPSession(POOL_CONNECTIONS, POOL_MAXSIZE)
+    api = OuedKnissAPI(rate_limiter=RateLimiter(args.rps), session=session, persisted_queries=args.persisted_queries)
+    api.api_url = url
+
+    workdir = tempfile.mkdtemp(prefix="ouedkniss_bench_")
+    previous_dir = os.getcwd()
+    os.chdir(workdir)
+    stages = {}
+    print(f"Stand-in API at {url}, mode {TYPE}, working in {workdir}")
+
+    try:
+        # Stage 1: ID scanning; "failed" counts listings still in the results that the scan missed
+        def scan():
+            ids = api.get_announcement_ids_from_pages("automobiles_vehicules", args.pages,
+                                                      parallel=not args.sequential_scan, snapshot=args.snapshot_scan)
+            missed = 0 if args.pages else len({str(ann_id) for ann_id in server.ids} - set(ids))
+            return ids, len(ids), missed
+        ids = timed_stage(stages, "scan", scan)
+
+        # Stage 2: Detail fetching
+        def details():
+            raws = {}
+            for ann_id, raw_data in api.get_announcement_details_concurrent(ids, args.workers, args.batch_size):
+                if raw_data:
+                    raws[ann_id] = raw_data
+            return raws, len(raws), len(ids) - len(raws)
+        raws = timed_stage(stages, "details", details)
+
+        # Stage 3: Image downloading (a subset, to keep disk usage reasonable)
+        def media():
+            pool = MediaDownloadPool(session, args.media_workers, args.media_rps)
+            for ann_id in list(raws)[:args.media_listings]:
+                pool.submit(ann_id, raws[ann_id].get("medias"))
+            results = pool.drain()
+            done = sum(summary["downloaded"] + summary["skipped"] for summary in results.values())
+            failed = sum(summary["failed"] for summary in results.values())
+            return results, done, failed
+        timed_stage(stages, "media", media)
+
+        # Stage 4: Processing
+        def process():
+            processor = DataProcessor()
+            rows = [processor.process_row(raw_data) for raw_data in raws.values()]
+            return rows, len(rows), 0
+        rows = timed_stage(stages, "process", process)
+
+        # Stage 5: CSV export
+        def export():
+            spec_labels = set()
+            for values, specs in rows:
+                spec_labels.update(specs)
+            csv_manager = CSVManager(os.path.join(workdir, "bench_export.csv"), spec_labels)
+            csv_manager.open()
+            written = csv_manager.write_rows(rows)
+            csv_manager.close()
+            return None, written, len(rows) - written
+        timed_stage(stages, "export", export)
+
+    finally:
+        os.chdir(previous_dir)
+        if not args.keep_files:
+            shutil.rmtree(workdir, ignore_errors=True)
+        connections = session.connection_stats()
+        session.close()
+        server.stop()
+
+    api_requests = sum(count for operation, count in server.stats["requests"].items() if operation != "media")
+    if api_requests:
+        print(f"API requests: {api_requests}, {server.stats['bytes_received'] / api_requests:.0f} bytes/request body "
+              f"(persisted queries: {server.stats['persisted_queries'] or 'off'})")
+
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "mode": TYPE,
+        "config": vars(args),
+        "workdir": workdir,
+        "stages": stages,
+        "total_seconds": round(sum(stage["seconds"] for stage in stages.values()), 4),
+        "server": server.stats,
+        "connections": connections,
+        "metrics": metrics.summary(),
+    }
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = run(args)
+
+    if args.baseline:
+        report["regressions"] = compare(report, args.baseline, args.tolerance)
+
+    with open(args.report, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.report} (total {report['total_seconds']}s)")
+
+    for regression in report.get("regressions", []):
+        print(f"REGRESSION in {regression['stage']}: {regression['baseline']}/s -> {regression['current']}/s "
+              f"({regression['change']:+.0%})")
+    sys.exit(1 if report.get("regressions") else 0)
@@ -0,0 +1,419 @@
+import sys
+import re
+import json
+import time
+import hashlib
+import random
+import threading
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+"""
+Local Stand-In for the OuedKniss GraphQL API and image CDN.
+Serves SearchQuery, AnnouncementGet and aliased AnnouncementGetBatch requests with
+the response shapes the scraper expects, plus image bytes under /media/. Detail
+responses hold only the fields the query selects, like the real API, so response
+sizes follow the generated query. Automatic persisted queries (query hash instead of
+query text, registered on first miss) are supported as well.
+Listings can be refreshed (moved to the top) or removed while the category is being
+scanned, to reproduce the page drift of long REFRESHED_AT-ordered scans.
+Latency, error rate, 429 throttling and payload sizes are configurable, so the
+scraper can be measured locally without touching production.
+"""
+
+
+_TOKEN = re.compile(r'\.\.\.|"[^"]*"|[A-Za-z_$][\w$]*|-?\d+(?:\.\d+)?|[{}():!,\[\]=@]')
+
+
+def parse_selection(text):
+    """
+    Parses the first GraphQL selection set in `text` into {response key: (field, subtree)}.
+    Arguments are skipped; fragment spreads are kept as ("...", name).
+    """
+    tokens = _TOKEN.findall(text)
+    position = tokens.index("{") + 1
+
+    def selection_set():
+        nonlocal position
+        tree = {}
+        while tokens[position] != "}":
+            token = tokens[position]
+            position += 1
+            if token == "...":
+                tree["..." + tokens[position]] = ("...", tokens[position])
+                position += 1
+                continue
+            key = field = token
+            if tokens[position] == ":":
+                field = tokens[position + 1]
+                position += 2
+            if tokens[position] == "(":
+                while tokens[position] != ")":
+                    position += 1
+                position += 1
+            subtree = None
+            if tokens[position] == "{":
+                position += 1
+                subtree = selection_set()
+            tree[key] = (field, subtree)
+        position += 1
+        return tree
+
+    return selection_set()
+
+
+def prune(value, tree):
+    """
+    Keeps only the selected fields of a response object (or of every object in a list).
+    """
+    if tree is None or value is None:
+        return value
+    if isinstance(value, list):
+        return [prune(item, tree) for item in value]
+    return {key: prune(value.get(field), subtree) for key, (field, subtree) in tree.items()}
+
+
+class StandInServer:
+    """
+    Threaded HTTP server answering like api.ouedkniss.com and its CDN.
+
+    Args:
+        total (int): Number of listings in the fake category.
+        latency (float): Seconds added to every response.
+        jitter (float): Extra random latency, uniformly drawn in [0, jitter].
+        error_rate (float): Share of requests answered with HTTP 500.
+        throttle_rate (float): Share of requests answered with HTTP 429 (with Retry-After).
+        retry_after (int): Retry-After value sent with 429 responses, in seconds.
+        spec_count (int): Specifications per listing.
+        media_count (int): Images per listing.
+        description_bytes (int): Length of each listing description.
+        image_bytes (int): Size of each image served by the CDN.
+        seed (int): Seed for latency jitter and injected failures.
+        persisted_queries (bool): Accept hash-only requests; False answers them
+                                  PERSISTED_QUERY_NOT_SUPPORTED, like a server without support.
+        refresh_rate (float): Listings refreshed (moved to the top) per search request.
+        removal_rate (float): Listings removed from the results per search request.
+    """
+    def __init__(self, total=3000, latency=0.02, jitter=0.0, error_rate=0.0, throttle_rate=0.0, retry_after=1,
+                 spec_count=8, media_count=3, description_bytes=600, image_bytes=50_000, seed=1,
+                 persisted_queries=True, refresh_rate=0.0, removal_rate=0.0):
+        self.total = total
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.spec_count = spec_count
+        self.media_count = media_count
+        self.description = ("Véhicule en très bon état, papiers à jour. " * (description_bytes // 40 + 1))[:description_bytes]
+        self.image = bytes(range(256)) * (image_bytes // 256) + bytes(image_bytes % 256)
+        self.persisted_queries = persisted_queries
+        # Registered persisted queries: SHA-256 hash -> query text
+        self.queries = {}
+
+        # Newest listing first, like the real REFRESHED_AT ordering
+        self.ids = list(range(50_000_000 + total, 50_000_000, -1))
+        self.base_time = datetime(2026, 1, 1)
+        self.refresh_rate = refresh_rate
+        self.removal_rate = removal_rate
+        # Refreshed listings: number -> minutes after base_time, newer than any original listing
+        self.refreshed = {}
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"requests": {}, "status": {}, "bytes_sent": 0, "bytes_received": 0, "persisted_queries": {},
+                      "churn": {"refreshed": 0, "removed": 0}}
+        self.httpd = None
+        self.url = None
+        self.media_url = None
+
+    # --- Lifecycle ---
+
+    def start(self):
+        """
+        Starts serving on a free local port.
+
+        Returns:
+            str: The GraphQL endpoint URL.
+        """
+        server = self
+
+        class Handler(StandInHandler):
+            stand_in = server
+
+        self.httpd = StandInHTTPServer(("127.0.0.1", 0), Handler)
+        host, port = self.httpd.server_address
+        self.url = f"http://{host}:{port}/graphql"
+        self.media_url = f"http://{host}:{port}/media"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self.url
+
+    def stop(self):
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+    # --- Fake data ---
+
+    def announcement(self, ann_id):
+        """
+        Builds the full detail object of one listing; details() prunes it to the query's selection.
+        """
+        n = int(ann_id) - 50_000_000
+        refreshed_at = (self.base_time + timedelta(minutes=self.refreshed.get(n, n))).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+        return {
+            "id": str(ann_id),
+            "reference": f"REF{n:08d}",
+            "title": f"Annonce {n}",
+            "slug": f"annonce-{n}",
+            "description": self.description,
+            "createdAt": refreshed_at,
+            "refreshedAt": refreshed_at,
+            "price": 1_000_000 + n,
+            "pricePreview": 1_000_000 + n,
+            "oldPrice": None,
+            "oldPricePreview": None,
+            "priceType": "FIXED",
+            "exchangeType": None,
+            "priceUnit": "DA",
+            "hasDelivery": False,
+            "deliveryType": None,
+            "hasPhone": True,
+            "hasEmail": False,
+            "quantity": 1,
+            "status": "PUBLISHED",
+            "street_name": None,
+            "category": {"id": "1", "slug": "automobiles_vehicules", "name": "Automobiles", "__typename": "Category"},
+            "defaultMedia": {"mediaUrl": f"{self.media_url}/{n}_0.jpg", "mimeType": "image/jpeg", "__typename": "Media"} if self.media_count else None,
+            "medias": [{"mediaUrl": f"{self.media_url}/{n}_{k}.jpg", "mimeType": "image/jpeg", "__typename": "Media"} for k in range(self.media_count)],
+            "specs": [
+                {"specification": {"label": f"Spec {k}", "codename": f"spec_{k}", "__typename": "Specification"},
+                 "value": [str(n % (k + 7))], "valueText": [str(n % (k + 7))], "__typename": "AnnouncementSpec"}
+                for k in range(self.spec_count)
+            ],
+            "user": {"id": str(n % 500), "username": f"user{n % 500}", "displayName": "Vendeur", "avatarUrl": None, "__typename": "User"},
+            "isFromStore": n % 5 == 0,
+            "store": {"id": str(n % 40), "name": "Auto Store", "slug": "auto-store", "description": "", "imageUrl": None,
+                      "followerCount": 120, "announcementsCount": 80, "status": "ACTIVE", "__typename": "Store"} if n % 5 == 0 else None,
+            "cities": [{"id": str(n % 58 + 1), "name": "Alger", "region": {"id": "16", "name": "Alger", "slug": "alger", "__typename": "Region"}, "__typename": "City"}],
+            "isCommentEnabled": True,
+            "noAdsense": False,
+            "variants": [],
+            "showAnalytics": False,
+            "messengerLink": None,
+            "orderExternalUrl": None,
+            "__typename": "Announcement",
+        }
+
+    def churn(self):
+        """
+        Refreshes and removes listings at the configured rates (called with the lock held).
+        """
+        def draw(rate):
+            return int(rate) + (self._random.random() < rate % 1)
+
+        for _ in range(draw(self.refresh_rate)):
+            ann_id = self.ids.pop(self._random.randrange(len(self.ids)))
+            self.refreshed[ann_id - 50_000_000] = self.total + len(self.refreshed) + 1
+            self.ids.insert(0, ann_id)
+            self.stats["churn"]["refreshed"] += 1
+        for _ in range(draw(self.removal_rate)):
+            if len(self.ids) > 1:
+                self.ids.pop(self._random.randrange(len(self.ids)))
+                self.stats["churn"]["removed"] += 1
+
+    def search_page(self, variables, query=""):
+        """
+        Answers a results page, plus the `previous` window of SearchQueryOverlap requests,
+        both from the same state of the results and pruned to the query's `data` selections.
+        """
+        # The listing selections, in query order: the page's own, then the `previous` window's
+        trees = [parse_selection(query[match.start():]) for match in re.finditer(r"\bdata\s*\{", query)] or [None]
+
+        def window(search_filter):
+            page = search_filter.get("page") or 1
+            count = search_filter.get("count") or 48
+            return page, count, self.ids[(page - 1) * count:page * count]
+
+        with self._lock:
+            self.churn()
+            page, count, chunk = window(variables.get("filter") or {})
+            previous = window(variables["previous"])[2] if variables.get("previous") else None
+            last_page = max(1, (len(self.ids) + count - 1) // count)
+
+        data = {"search": {"announcements": {
+            "data": [prune(self.announcement(ann_id), trees[0]) for ann_id in chunk],
+            "paginatorInfo": {"lastPage": last_page, "hasMorePages": page < last_page},
+        }}}
+        if previous is not None:
+            data["previous"] = {"announcements": {"data": [prune(self.announcement(ann_id), trees[-1]) for ann_id in previous]}}
+        return {"data": data}
+
+    def details(self, variables, query=""):
+        # The announcement selection: the shared fragment of a batch, or the single query's own
+        if "fragment AnnouncementFields" in query:
+            tree = parse_selection(query[query.index("fragment AnnouncementFields"):])
+        elif "announcementDetails" in query:
+            tree = parse_selection(query[query.index("announcementDetails"):])
+        else:
+            tree = None
+
+        if "id" in variables:
+            return {"data": {"announcement": prune(self.announcement(variables["id"]), tree)}}
+        # Batched request: id<i> variables answer under alias a<i>
+        return {"data": {f"a{name[2:]}": prune(self.announcement(value), tree) for name, value in variables.items()}}
+
+    def persisted_query(self, extension, query=None):
+        """
+        Resolves the query text of a persisted-query request, registering it when sent along.
+
+        Args:
+            extension (dict): The request's `extensions.persistedQuery` ({"version", "sha256Hash"}).
+            query (str, optional): The full query text, when the client registers it.
+
+        Returns:
+            tuple: (query text, None), or (None, (status, error body)) when the request is refused.
+        """
+        def refuse(status, code, message):
+            self.count("persisted_queries", code or "invalid")
+            return None, (status, {"errors": [{"message": message, "extensions": {"code": code}}]})
+
+        if not self.persisted_queries:
+            return refuse(200, "PERSISTED_QUERY_NOT_SUPPORTED", "PersistedQueryNotSupported")
+        sha256 = extension.get("sha256Hash")
+        if query is None:
+            with self._lock:
+                query = self.queries.get(sha256)
+            if query is None:
+                return refuse(200, "PERSISTED_QUERY_NOT_FOUND", "PersistedQueryNotFound")
+            self.count("persisted_queries", "hit")
+            return query, None
+        if hashlib.sha256(query.encode("utf-8")).hexdigest() != sha256:
+            return refuse(400, None, "provided sha does not match query")
+        with self._lock:
+            self.queries[sha256] = query
+        self.count("persisted_queries", "registered")
+        return query, None
+
+    # --- Bookkeeping ---
+
+    def draw_failure(self):
+        """
+        Decides whether the current request fails: returns 429, 500 or None.
+        """
+        with self._lock:
+            roll = self._random.random()
+            delay = self.latency + (self._random.random() * self.jitter if self.jitter else 0)
+        time.sleep(delay)
+        if roll < self.throttle_rate:
+            return 429
+        if roll < self.throttle_rate + self.error_rate:
+            return 500
+        return None
+
+    def record(self, operation, status, size):
+        with self._lock:
+            self.stats["requests"][operation] = self.stats["requests"].get(operation, 0) + 1
+            self.stats["status"][str(status)] = self.stats["status"].get(str(status), 0) + 1
+            self.stats["bytes_sent"] += size
+
+    def record_received(self, size):
+        with self._lock:
+            self.stats["bytes_received"] += size
+
+    def count(self, stat, key, amount=1):
+        with self._lock:
+            self.stats[stat][key] = self.stats[stat].get(key, 0) + amount
+
+
+class StandInHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients dropping keep-alive connections at shutdown are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so pooled sessions reuse their connections like against the real API
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as separate writes; without TCP_NODELAY every keep-alive
+    # response would wait on delayed ACKs and the benchmark would mostly measure that
+    disable_nagle_algorithm = True
+    stand_in = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, operation, status, body=b"", content_type="application/json", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.stand_in.record(operation, status, len(body))
+
+    def _fail(self, operation, status):
+        headers = {"Retry-After": str(self.stand_in.retry_after)} if status == 429 else None
+        self._send(operation, status, b'{"errors":[{"message":"stand-in failure"}]}', headers=headers)
+
+    def do_GET(self):
+        if not self.path.startswith("/media/"):
+            return self._send("other", 404, b"")
+        status = self.stand_in.draw_failure()
+        if status:
+            return self._fail("media", status)
+        self._send("media", 200, self.stand_in.image, content_type="image/jpeg")
+
+    def do_HEAD(self):
+        # Headers of a media file only, like the CDN answers size checks
+        if not self.path.startswith("/media/"):
+            return self._send("other", 404)
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(self.stand_in.image)))
+        self.end_headers()
+        self.stand_in.record("media_head", 200, 0)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.stand_in.record_received(length)
+        try:
+            payload = json.loads(self.rfile.read(length))
+        except ValueError:
+            return self._send("invalid", 400, b'{"errors":[{"message":"invalid JSON"}]}')
+
+        operation = payload.get("operationName") or "unknown"
+        status = self.stand_in.draw_failure()
+        if status:
+            return self._fail(operation, status)
+
+        query = payload.get("query")
+        extension = (payload.get("extensions") or {}).get("persistedQuery")
+        if extension:
+            query, refused = self.stand_in.persisted_query(extension, query)
+            if refused:
+                status, body = refused
+                return self._send(operation, status, json.dumps(body).encode("utf-8"))
+
+        variables = payload.get("variables") or {}
+        if operation.startswith("SearchQuery"):
+            body = self.stand_in.search_page(variables, query or "")
+        else:
+            body = self.stand_in.details(variables, query or "")
+        self._send(operation, 200, json.dumps(body, ensure_ascii=False).encode("utf-8"))
+
+
+if __name__ == "__main__":
+    # Stand-alone mode: point API_URL in settings.py at the printed endpoint
+    stand_in = StandInServer()
+    print(f"Stand-in GraphQL endpoint: {stand_in.start()}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stand_in.stop()
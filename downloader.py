@@ -1,18 +1,114 @@
 import os
-import requests
 import time
-from settings import HEADER, WAIT_TIME
+import json
+import queue
+import hashlib
+import threading
+from settings import HEADER, WAIT_TIME, MEDIA_TIMEOUT, MEDIA_WORKERS, MEDIA_REQUESTS_PER_SECOND, MEDIA_QUEUE_SIZE
+from http_session import get_default_session
+from rate_limit import HostRateLimiter
+from metrics import metrics
+from log import get_logger
 
-def download_announcement_images(ann_id, media_list):
+log = get_logger("media")
+
+MANIFEST_NAME = "manifest.json"
+
+
+def load_manifest(ann_dir):
+    """
+    Reads the media manifest of an announcement folder.
+    
+    Returns:
+        dict: {file_name: {"url", "size", "sha256", "etag"}}, empty if there is none yet.
+    """
+    path = os.path.join(ann_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except ValueError:
+        return {}
+
+
+def save_manifest(ann_dir, manifest):
+    """
+    Writes the manifest through a temp file so it is never left half-written.
+    """
+    path = os.path.join(ann_dir, MANIFEST_NAME)
+    temp_path = f"{path}.part"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temp_path, path)
+
+
+def media_status(ann_dir, file_name, url, manifest):
+    """
+    Classifies one media slot using the manifest and the file size only (no byte reads).
+    
+    Returns:
+        str: "complete", "partial" (missing or wrong size) or "stale" (listing now points to another URL).
+    """
+    entry = manifest.get(file_name)
+    if not entry:
+        return "partial"
+    if entry.get("url") != url:
+        return "stale"
+    
+    file_path = os.path.join(ann_dir, file_name)
+    if not os.path.exists(file_path) or os.path.getsize(file_path) != entry.get("size"):
+        return "partial"
+    return "complete"
+
+
+def _hash_file(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def remote_size(url, session, rate_limiter=None):
+    """
+    Asks the CDN for the size of a media file with a HEAD request.
+    
+    Returns:
+        int: The Content-Length, or None if the request failed or the CDN did not send one.
+    """
+    if rate_limiter:
+        rate_limiter.acquire(url)
+    try:
+        with session.head(url, headers=HEADER, timeout=MEDIA_TIMEOUT, allow_redirects=True) as response:
+            length = response.headers.get("Content-Length")
+            if response.status_code == 200 and length and length.isdigit():
+                return int(length)
+    except Exception as e:
+        log.debug("  HEAD request failed for %s: %s", url, e)
+    return None
+
+
+def download_announcement_images(ann_id, media_list, session=None, rate_limiter=None):
     """
     Downloads and organizes images for a specific announcement.
+    A manifest in the announcement folder records each media URL, size, SHA-256 and ETag,
+    so re-runs can tell complete, partial and stale media apart without re-reading images.
     
     Args:
         ann_id (str): The unique identifier for the announcement.
         media_list (list): A list of media dictionaries from the API containing 'mediaUrl'.
+        session (HTTPSession, optional): Pooled session to reuse CDN connections.
+        rate_limiter (HostRateLimiter, optional): Per-host limiter used instead of the fixed WAIT_TIME delay.
+        
+    Returns:
+        dict: Counts of "downloaded", "skipped" and "failed" images.
     """
+    summary = {"downloaded": 0, "skipped": 0, "failed": 0}
     if not media_list:
-        return
+        return summary
+    
+    session = session or get_default_session()
     
     # Define and create the destination directory
     base_dir = "downloads"
@@ -20,13 +116,10 @@ def download_announcement_images(ann_id, media_list):
     
     if not os.path.exists(ann_dir):
         os.makedirs(ann_dir, exist_ok=True)
-        print(f"Created directory: {ann_dir}")
-    else:
-        # Optimization: Skip if images are already present
-        existing_files = os.listdir(ann_dir)
-        if len(existing_files) >= len(media_list):
-            print(f"Images already exist for ID {ann_id}, skipping.")
-            return
+        log.debug("Created directory: %s", ann_dir)
+    
+    manifest = load_manifest(ann_dir)
+    wanted_files = set()
 
     # Iterate and download each media asset
     for i, media in enumerate(media_list):
@@ -40,29 +133,157 @@ def download_announcement_images(ann_id, media_list):
             
         if url_no_params.lower().endswith((".png", ".jpeg", ".webp", ".jpg")):
             ext = os.path.splitext(url_no_params)[1]
-            
-        file_path = os.path.join(ann_dir, f"image_{i+1}{ext}")
         
-        # Avoid redownloading existing individual files
-        if os.path.exists(file_path):
+        file_name = f"image_{i+1}{ext}"
+        file_path = os.path.join(ann_dir, file_name)
+        wanted_files.add(file_name)
+        
+        # Adopt files downloaded before manifests existed (hashed once, then trusted by size).
+        # The old writer left truncated files behind, so only files the CDN confirms the size of
+        # are adopted; the others stay "partial" and are downloaded again
+        if file_name not in manifest and os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+            if remote_size(url, session, rate_limiter) == os.path.getsize(file_path):
+                manifest[file_name] = {"url": url, "size": os.path.getsize(file_path), "sha256": _hash_file(file_path), "etag": None}
+                save_manifest(ann_dir, manifest)
+            else:
+                log.debug("  Existing %s does not match the CDN size, downloading it again.", file_path)
+        
+        status = media_status(ann_dir, file_name, url, manifest)
+        if status == "complete":
+            summary["skipped"] += 1
+            metrics.inc("images_total", result="skipped")
             continue
 
-        print(f"  Downloading image {i+1}/{len(media_list)} for ID {ann_id}...")
+        log.debug("  Downloading image %d/%d for ID %s (%s)...", i + 1, len(media_list), ann_id, status)
+        temp_path = f"{file_path}.part"
         try:
+            if rate_limiter:
+                rate_limiter.acquire(url)
+            
             # Use stream=True for large files to keep memory usage low
-            response = requests.get(url, headers=HEADER, stream=True, timeout=15)
-            if response.status_code == 200:
-                with open(file_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        f.write(chunk)
-            else:
-                print(f"  Failed to download image: HTTP {response.status_code}")
+            # The context manager also releases the connection of non-200 responses, which are never read
+            with session.get(url, headers=HEADER, stream=True, timeout=MEDIA_TIMEOUT) as response:
+                if response.status_code == 200:
+                    # Hash and size are computed while streaming; the file only appears once complete
+                    digest = hashlib.sha256()
+                    size = 0
+                    with open(temp_path, 'wb') as f:
+                        for chunk in response.iter_content(chunk_size=8192):
+                            f.write(chunk)
+                            digest.update(chunk)
+                            size += len(chunk)
+                    os.replace(temp_path, file_path)
+                
+                    manifest[file_name] = {"url": url, "size": size, "sha256": digest.hexdigest(), "etag": response.headers.get("ETag")}
+                    save_manifest(ann_dir, manifest)
+                    summary["downloaded"] += 1
+                    metrics.inc("images_total", result="downloaded")
+                    metrics.inc("media_bytes_total", size)
+                else:
+                    log.warning("  Failed to download image: HTTP %s", response.status_code)
+                    summary["failed"] += 1
+                    metrics.inc("images_total", result="failed")
                 
             # Respectful delay between media downloads to prevent rate limiting
-            time.sleep(WAIT_TIME)
+            if not rate_limiter:
+                time.sleep(WAIT_TIME)
             
         except Exception as e:
-            print(f"  Error downloading image {url}: {e}")
+            log.warning("  Error downloading image %s: %s", url, e)
+            summary["failed"] += 1
+            metrics.inc("images_total", result="failed")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    
+    # Drop media the listing no longer has
+    for file_name in set(manifest) - wanted_files:
+        file_path = os.path.join(ann_dir, file_name)
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        del manifest[file_name]
+        save_manifest(ann_dir, manifest)
+    
+    return summary
+
+class MediaDownloadPool:
+    """
+    Producer/consumer stage for media downloads.
+    The detail loop submits listings and keeps fetching while a pool of worker
+    threads streams images to disk under the CDN's own per-host rate limit.
+    """
+    def __init__(self, session=None, workers=MEDIA_WORKERS, requests_per_second=MEDIA_REQUESTS_PER_SECOND, queue_size=MEDIA_QUEUE_SIZE, rate_limiter=None):
+        self.session = session or get_default_session()
+        # Pools of concurrently scraped categories pass one shared limiter, so the CDN budget is not multiplied
+        self.rate_limiter = rate_limiter or HostRateLimiter(requests_per_second)
+        # Bounded queue: if media falls far behind, the producer waits instead of buffering without limit
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.results = {}
+        self._lock = threading.Lock()
+        self._stopped = False
+        self._workers = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+        for worker in self._workers:
+            worker.start()
+    
+    def _work(self):
+        while True:
+            job = self.jobs.get()
+            try:
+                if job is None:
+                    return
+                ann_id, media_list = job
+                try:
+                    with metrics.timer("media_listing_seconds"):
+                        summary = download_announcement_images(ann_id, media_list, self.session, self.rate_limiter)
+                except Exception as e:
+                    log.error("  Media worker error for ID %s: %s", ann_id, e)
+                    summary = {"downloaded": 0, "skipped": 0, "failed": len(media_list)}
+                with self._lock:
+                    self.results[ann_id] = summary
+            finally:
+                self.jobs.task_done()
+    
+    def submit(self, ann_id, media_list):
+        if media_list:
+            self.jobs.put((ann_id, media_list))
+    
+    def drain(self):
+        """
+        Waits for every queued listing to finish and stops the workers.
+        
+        Returns:
+            dict: {ann_id: {"downloaded", "skipped", "failed"}} for each submitted listing.
+        """
+        if not self._stopped:
+            self._stopped = True
+            for _ in self._workers:
+                self.jobs.put(None)
+            for worker in self._workers:
+                worker.join()
+        return self.results
+    
+    def stop(self):
+        """
+        Abandons queued listings and stops the workers (used when a run aborts).
+        Images already on disk are kept; the rest are picked up by the next run.
+        """
+        if self._stopped:
+            return
+        while True:
+            try:
+                self.jobs.get_nowait()
+                self.jobs.task_done()
+            except queue.Empty:
+                break
+        self.drain()
+    
+    def print_report(self):
+        complete = [ann_id for ann_id, summary in self.results.items() if not summary["failed"]]
+        incomplete = {ann_id: summary for ann_id, summary in self.results.items() if summary["failed"]}
+        
+        log.info("Media complete for %d/%d listings.", len(complete), len(self.results))
+        for ann_id, summary in incomplete.items():
+            log.warning("  ID %s: %d image(s) failed, %d present.",
+                        ann_id, summary['failed'], summary['downloaded'] + summary['skipped'])
 
 if __name__ == "__main__":
     # Simple test case for independent verification
@@ -0,0 +1,208 @@
+import os
+import csv
+import json
+import time
+import sqlite3
+import threading
+from itertools import islice
+from settings import ENTITY_CACHE_FILE, ENTITY_CACHE_TTL, BATCH_SIZE, OUTPUT
+from process import compile_extractor
+from metrics import metrics
+from log import get_logger
+
+"""
+Store and User Entity Cache.
+Large dealers have thousands of listings that all repeat the same `store` and `user`
+subtrees. With ENTITY_CACHE on, they are kept in a local SQLite cache with a TTL and
+exported once per entity to a stores / users table that rows join to by key. Detail
+queries only select the `id` of ENTITY_CACHE_SLIM entities, which are fetched only when
+missing or expired; the others are cached straight from the detail responses.
+"""
+
+log = get_logger("entity_cache")
+
+
+class EntityCache:
+    """
+    SQLite-backed cache of store and user subtrees, keyed by (kind, id).
+    Entries older than `ttl` seconds count as missing. Shared by every category and
+    thread of a process.
+    """
+    def __init__(self, filename=ENTITY_CACHE_FILE, ttl=ENTITY_CACHE_TTL):
+        self.ttl = ttl
+        self.conn = sqlite3.connect(filename, timeout=30, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS entities (
+                kind TEXT NOT NULL,
+                id TEXT NOT NULL,
+                data TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (kind, id)
+            )
+        """)
+        self.conn.commit()
+
+    def get(self, kind, entity_id, ignore_ttl=False):
+        """
+        Args:
+            ignore_ttl (bool): Also return expired entries (offline re-exports have nothing fresher).
+
+        Returns:
+            dict: The cached subtree, or None if it is missing or expired.
+        """
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT data, fetched_at FROM entities WHERE kind = ? AND id = ?", (kind, str(entity_id))
+            ).fetchone()
+        if row is None or (self.ttl and not ignore_ttl and time.time() - row[1] > self.ttl):
+            return None
+        return json.loads(row[0])
+
+    def put_many(self, kind, entities):
+        """
+        Stores {entity id: subtree} in one transaction.
+        """
+        now = time.time()
+        rows = [(kind, str(entity_id), json.dumps(data, ensure_ascii=False), now) for entity_id, data in entities.items()]
+        with self._lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO entities VALUES (?, ?, ?, ?)", rows)
+
+    def close(self):
+        self.conn.close()
+
+
+class EntityResolver:
+    """
+    Follows the stores and users referenced by the listings of one run: caches the full
+    subtrees the detail responses carry, backfills the ones still missing through one
+    listing that references them, then writes each entity table.
+
+    Args:
+        cache (EntityCache): The shared entity cache.
+        tables (dict): {entity: [key column, *columns]}, from process.entity_tables.
+        ignore_ttl (bool): Export expired entries too (offline re-export, where nothing is fetched).
+    """
+    def __init__(self, cache, tables, ignore_ttl=False):
+        self.cache = cache
+        self.tables = tables
+        self.ignore_ttl = ignore_ttl
+        # {entity: {entity id: an announcement ID referencing it}}
+        self.refs = {entity: {} for entity in tables}
+        # {entity: {entity id: subtree}} received in full with the details of this run
+        self.received = {entity: {} for entity in tables}
+        # The FIELDS paths of entity columns start at the listing ("store.name"), so rows
+        # are extracted from a {entity: subtree} wrapper with the regular compiled extractor
+        self.extractors = {entity: compile_extractor(columns) for entity, columns in tables.items()}
+
+    def observe(self, ann_id, raw_data):
+        for entity, refs in self.refs.items():
+            subtree = raw_data.get(entity)
+            if subtree and subtree.get("id") is not None:
+                refs.setdefault(str(subtree["id"]), ann_id)
+                # More than the id: the detail query selected the whole entity (not in ENTITY_CACHE_SLIM)
+                if len(subtree) > 1:
+                    self.received[entity][str(subtree["id"])] = subtree
+
+    def resolve(self, api, fields, batch_size=BATCH_SIZE):
+        """
+        Caches the entities received with the details, then fetches the ones still
+        missing (or expired), one listing per entity.
+
+        Args:
+            api (OuedKnissAPI): The API client.
+            fields (str): Entity selection, from query_builder.entity_fields.
+            batch_size (int): Listings per aliased request.
+        """
+        for entity, entities in self.received.items():
+            self.cache.put_many(entity, entities)
+            metrics.inc("entities_total", len(entities), entity=entity, source="details")
+
+        missing = {entity: [entity_id for entity_id in refs
+                            if entity_id not in self.received[entity] and self.cache.get(entity, entity_id) is None]
+                   for entity, refs in self.refs.items()}
+        for entity, refs in self.refs.items():
+            cached = len(refs) - len(missing[entity]) - len(self.received[entity])
+            metrics.inc("entities_total", cached, entity=entity, source="cache")
+
+        # A listing missing both its store and its user backfills the two at once
+        ann_ids = iter(dict.fromkeys(self.refs[entity][entity_id] for entity, ids in missing.items() for entity_id in ids))
+        wanted = {entity: set(ids) for entity, ids in missing.items()}
+        fetched_counts = {entity: 0 for entity in self.tables}
+        while True:
+            chunk = list(islice(ann_ids, batch_size))
+            if not chunk:
+                break
+            fetched = {entity: {} for entity in self.tables}
+            for raw_data in api.get_announcement_details_batch(chunk, fields).values():
+                for entity in self.tables:
+                    subtree = (raw_data or {}).get(entity)
+                    # Entities the listing carries besides the missing one are already cached
+                    if subtree and str(subtree.get("id")) in wanted[entity]:
+                        fetched[entity][str(subtree["id"])] = subtree
+            for entity, entities in fetched.items():
+                self.cache.put_many(entity, entities)
+                fetched_counts[entity] += len(entities)
+                metrics.inc("entities_total", len(entities), entity=entity, source="api")
+
+        log.info("Entities: %s.", ", ".join(
+            f"{len(refs)} {entity}s ({len(self.received[entity])} with the details, "
+            f"{len(missing[entity])} missing, {fetched_counts[entity]} fetched)"
+            for entity, refs in self.refs.items()))
+
+    def rows(self, entity):
+        extract = self.extractors[entity]
+        for entity_id in self.refs[entity]:
+            subtree = self.received[entity].get(entity_id) or self.cache.get(entity, entity_id, self.ignore_ttl)
+            if subtree is not None:
+                yield extract({entity: subtree})
+
+    def export(self, filename, output=OUTPUT):
+        """
+        Writes every referenced entity the cache holds: `<output>_stores.csv` / `_users.csv`
+        next to the CSV export, or upserted `stores` / `users` tables in the SQLite database.
+
+        Returns:
+            dict: {entity: rows written}
+        """
+        written = {}
+        for entity, columns in self.tables.items():
+            rows = list(self.rows(entity))
+            if output == "SQLITE":
+                write_entity_table(filename, f"{entity}s", columns, rows)
+            else:
+                root, extension = os.path.splitext(filename)
+                with open(f"{root}_{entity}s{extension}", 'w', newline='', encoding='utf-8') as f:
+                    writer = csv.writer(f)
+                    writer.writerow(columns)
+                    writer.writerows(rows)
+            written[entity] = len(rows)
+        return written
+
+
+def write_entity_table(filename, table, columns, rows):
+    """
+    Upserts entity rows into `table` of a SQLite database, keyed by the first column.
+    """
+    key = columns[0]
+    conn = sqlite3.connect(filename, timeout=30)
+    try:
+        # Migration and upsert in one write transaction, so concurrent shards never add the same column twice
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(f'CREATE TABLE IF NOT EXISTS {table} ("{key}" TEXT PRIMARY KEY)')
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for column in columns:
+            if column not in existing:
+                conn.execute(f'ALTER TABLE {table} ADD COLUMN "{column}"')
+
+        quoted = ", ".join(f'"{column}"' for column in columns)
+        placeholders = ", ".join("?" for _ in columns)
+        updates = ", ".join(f'"{column}" = excluded."{column}"' for column in columns[1:])
+        with conn:
+            conn.executemany(f"INSERT INTO {table} ({quoted}) VALUES ({placeholders}) "
+                             f"ON CONFLICT(\"{key}\") DO UPDATE SET {updates}",
+                             [(str(row[0]), *row[1:]) for row in rows])
+    finally:
+        conn.close()
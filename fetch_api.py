@@ -1,101 +1,480 @@
-import requests
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from settings import *
-from utils import get_payload_search
+from itertools import islice
+from utils import get_payload_search, get_payload_search_overlap, get_payload_post, get_payload_post_batch
+from utils import get_persisted_payload, get_persisted_query_error, PERSISTED_QUERY_NOT_FOUND
+from query_builder import detail_fields, detail_paths
+from rate_limit import RateLimiter, AdaptiveRateLimiter, CircuitBreaker, CircuitOpenError, backoff_delay, parse_retry_after
+from http_session import get_default_session
+from json_backend import loads as json_loads
+from metrics import metrics
+from log import get_logger, fields
 
 """
 API Client for OuedKniss GraphQL.
 Handles searching for IDs and fetching full announcement details.
 """
 
-# Dynamic import of detail payload structure
-if TYPE=="MINI":
-    from utils import get_payload_post_mini as get_payload_post
-elif TYPE=="ALL":
-    from utils import get_payload_post_all as get_payload_post
+log = get_logger("api")
+
+# Detail field selection, generated from the columns this run exports (TYPE and OUTPUT_COLUMNS)
+ANNOUNCEMENT_FIELDS = detail_fields(TYPE)
+ANNOUNCEMENT_PATHS = detail_paths(TYPE)
+
+def create_rate_limiter(share=1):
+    """
+    Builds the API rate limiter configured in settings.py (adaptive or fixed).
+    
+    Args:
+        share (float): Fraction of the configured rates this process may use
+                       (local shard processes split one budget, see sharding.launch_shards).
+    """
+    def scaled(rate):
+        return rate * share if rate else rate
+    
+    if ADAPTIVE_RATE:
+        return AdaptiveRateLimiter(scaled(REQUESTS_PER_SECOND), scaled(MIN_REQUESTS_PER_SECOND), scaled(MAX_REQUESTS_PER_SECOND),
+                                   scaled(RATE_INCREASE_STEP), RATE_INCREASE_WINDOW, RATE_BACKOFF_FACTOR, LATENCY_BACKOFF_RATIO)
+    return RateLimiter(scaled(REQUESTS_PER_SECOND))
 
 class OuedKnissAPI:
-    def __init__(self):
+    def __init__(self, rate_limiter=None, session=None, on_search_page=None, breaker=None, persisted_queries=PERSISTED_QUERIES):
         self.api_url = API_URL
         self.headers = HEADER
+        # Send query hashes instead of query texts; turned off if the server doesn't support it
+        self.persisted_queries = persisted_queries
+        # Optional callback receiving the listings of every search page fetched.
+        # SUMMARY mode uses it to harvest rows without detail calls. It may run on worker threads.
+        self.on_search_page = on_search_page
+        # Pooled keep-alive session (shared with the downloader when injected)
+        self.session = session or get_default_session()
+        # One limiter shared by every worker thread using this client
+        self.rate_limiter = rate_limiter or create_rate_limiter()
+        # Pauses all workers while the API is down
+        self.breaker = breaker or CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_COOLDOWN, BREAKER_MAX_WAIT)
+
+
+    def _post(self, payload, timeout, target):
+        """
+        Sends one GraphQL request, retrying transient failures.
+        Connection errors, 429 and 5xx are retried with jittered exponential backoff
+        (or the server's Retry-After); every outcome is reported to the rate limiter
+        and the circuit breaker.
+        With persisted queries on, only the query hash is sent; when the server doesn't
+        know it, the request is repeated once with the full text to register it.
+        
+        Args:
+            payload (dict): The GraphQL request payload.
+            timeout (int): Request timeout in seconds.
+            target (str): What is being fetched, for log messages (e.g. "page 3").
+            
+        Returns:
+            requests.Response: The HTTP 200 response, or None if retries ran out
+                               or the status is not worth retrying (e.g. 400, 404).
+        """
+        operation = payload.get("operationName")
+        persisted = self.persisted_queries
+        body = get_persisted_payload(payload) if persisted else payload
+        
+        attempt = 0
+        while attempt < TRIES:
+            self.breaker.before_request()
+            self.rate_limiter.acquire()
+            
+            start = time.perf_counter()
+            retry_after = None
+            try:
+                response = self.session.post(self.api_url, json=body, headers=self.headers, timeout=timeout)
+            except Exception as e:
+                status = None
+                log.warning("Connection error for %s (attempt %d/%d): %s", target, attempt + 1, TRIES, e)
+            else:
+                status = response.status_code
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            
+            self.rate_limiter.record(status, time.perf_counter() - start, retry_after)
+            if status is not None and status != 429 and status < 500:
+                self.breaker.record_success()
+                if persisted:
+                    persisted = False
+                    error = get_persisted_query_error(response.content)
+                    if error == PERSISTED_QUERY_NOT_FOUND:
+                        # Unknown hash: send the full text once, the server stores it for the next requests
+                        metrics.inc("persisted_queries_total", operation=operation, result="registered")
+                        body = get_persisted_payload(payload, register=True)
+                        continue
+                    if error:
+                        log.warning("The API does not support persisted queries; sending full query texts.")
+                        metrics.inc("persisted_queries_total", operation=operation, result="unsupported")
+                        self.persisted_queries = False
+                        body = payload
+                        continue
+                    metrics.inc("persisted_queries_total", operation=operation, result="hit")
+                if status == 200:
+                    return response
+                log.warning("Error for %s: HTTP %s", target, status)
+                return None
+            
+            self.breaker.record_failure()
+            if status is not None:
+                log.warning("HTTP %s for %s (attempt %d/%d).", status, target, attempt + 1, TRIES)
+            if attempt < TRIES - 1:
+                metrics.inc("retries_total", operation=operation, reason=status or "connection")
+                time.sleep(backoff_delay(attempt, WAIT_TIME_RETRY, RETRY_MAX_DELAY, retry_after))
+            attempt += 1
+        
+        log.error("Giving up on %s after %d attempts.", target, TRIES)
+        return None
+
+
+    def fetch_search_page(self, category_slug, page, overlap=0):
+        """
+        Fetches a single search page, retrying transient failures.
+        
+        Args:
+            category_slug (str): The category to scan.
+            page (int): The page number to fetch.
+            overlap (int, optional): Also re-read the last `overlap` listings of the previous
+                                     page in the same request (see get_payload_search_overlap).
+            
+        Returns:
+            dict: The `announcements` object ({"data", "paginatorInfo"}), or None if the page failed.
+                  With `overlap`, "previous" holds the listings now at the end of the previous page.
+        """
+        if overlap:
+            payload = get_payload_search_overlap(category_slug, page, overlap, summary=TYPE=="SUMMARY")
+        else:
+            payload = get_payload_search(category_slug, page, summary=TYPE=="SUMMARY")
+        
+        response = self._post(payload, SEARCH_TIMEOUT, f"page {page}")
+        if response is None:
+            metrics.inc("pages_scanned_total", result="failed")
+            return None
+        
+        try:
+            data = json_loads(response.content)["data"]
+            announcements = data["search"]["announcements"]
+            if overlap:
+                announcements["previous"] = data["previous"]["announcements"]["data"]
+        except (KeyError, TypeError, ValueError) as e:
+            log.warning("Data format error on page %d: %s", page, e)
+            metrics.inc("pages_scanned_total", result="failed")
+            return None
+        
+        metrics.inc("pages_scanned_total", result="ok")
+        if self.on_search_page:
+            self.on_search_page(announcements["data"])
+            if overlap:
+                # Listings recovered from the previous page's window need their summary too
+                self.on_search_page(announcements["previous"])
+        return announcements
 
 
-    def get_announcement_ids_from_pages(self, category_slug, max_pages=None):
+    def get_announcement_ids_from_pages(self, category_slug, max_pages=None, parallel=None, snapshot=None):
         """
         Scans OuedKniss category pages to build a list of announcement IDs.
         
         Args:
             category_slug (str): The category to scan.
             max_pages (int, optional): Max pages to scan. If None, scans until end.
+            parallel (bool, optional): Fan the page range out over a worker pool.
+                                       Defaults to SCAN_MODE == "PARALLEL".
+            snapshot (bool, optional): Sequential scan with page drift detection (see _scan_pages_snapshot).
+                                       Defaults to SCAN_MODE == "SNAPSHOT"; takes precedence over `parallel`.
             
         Returns:
-            set: Unique set of announcement IDs.
+            list: Unique announcement IDs, in page order (most recently refreshed first).
         """
-        # If max_pages is not provided, fetch the first page to determine the total page count
-        if not max_pages:
-            payload = get_payload_search(category_slug, 1)
-            try:
-                response = requests.post(self.api_url, json=payload, headers=self.headers, timeout=30)
-                paginator = response.json()["data"]["search"]["announcements"]["paginatorInfo"]
-                max_pages = paginator.get("lastPage", 1)
-            except Exception as e:
-                print("Could not fetch initial page info, retrying might be necessary.")
-                print(e)
+        if parallel is None:
+            parallel = SCAN_MODE == "PARALLEL"
+        if snapshot is None:
+            snapshot = SCAN_MODE == "SNAPSHOT"
+        
+        # Page 1 is always fetched first: it carries the total page count
+        first_page = self.fetch_search_page(category_slug, 1)
+        if not first_page:
+            log.error("Could not fetch initial page info, retrying might be necessary.")
+            return []
+        
+        last_page = first_page["paginatorInfo"].get("lastPage") or 1
+        max_pages = min(max_pages, last_page) if max_pages else last_page
+        
+        # Insertion-ordered dict used as an ordered set
+        all_ids = dict.fromkeys(announcement["id"] for announcement in first_page["data"])
+        
+        log.info("Starting ID extraction across %d pages...", max_pages)
+        if snapshot:
+            self._scan_pages_snapshot(category_slug, first_page, max_pages, all_ids)
+        elif parallel:
+            self._scan_pages_parallel(category_slug, range(2, max_pages + 1), all_ids)
+        else:
+            self._scan_pages_sequential(category_slug, first_page, max_pages, all_ids)
+        
+        log.info("ID extraction completed. %d total unique IDs found.", len(all_ids))
+        return list(all_ids)
 
-        all_ids = set()
+
+    def get_new_announcement_ids(self, category_slug, watermark=None, max_pages=None, known_ids=None, stop_pages=INCREMENTAL_STOP_PAGES, shard=None):
+        """
+        Incremental scan: walks pages newest-first (results are ordered by REFRESHED_AT)
+        and stops as soon as `stop_pages` consecutive pages hold only known listings.
         
-        print(f"Starting ID extraction across {max_pages} pages...")
-        for page in range(1, max_pages + 1):        
-            print(f"Scanning Page {page}...")
+        Args:
+            category_slug (str): The category to scan.
+            watermark (dict, optional): {"refreshed_at": str, "ids": list} from the previous run.
+                                        With "rescan" (a previous scan lost pages), known pages only
+                                        end the scan once they are behind the watermark.
+            max_pages (int, optional): Hard cap on pages to scan. If None, scans until end.
+            known_ids (set, optional): Already tracked IDs, also treated as known.
+            stop_pages (int): Consecutive all-known pages required to stop early.
+            shard (Shard, optional): IDs outside this shard are never fetched here, so they count as known.
             
-            payload = get_payload_search(category_slug, page)
+        Returns:
+            tuple: (list of IDs not covered by the watermark, updated watermark dict,
+                    list of pages that failed every retry)
+        """
+        mark_time = watermark.get("refreshed_at") if watermark else None
+        mark_ids = set(watermark.get("ids", [])) if watermark else set()
+        rescan = bool(watermark and watermark.get("rescan"))
+        known_ids = known_ids or set()
+        
+        newest_time, newest_ids = mark_time, set(mark_ids)
+        new_ids = {}
+        failed_pages = []
+        stale_pages = 0
+        scanned_pages = 0
+        last_page = max_pages
+        page = 1
+        
+        log.info("Starting incremental ID extraction (watermark: %s)...", mark_time or 'none')
+        while last_page is None or page <= last_page:
+            if page > 1:
+                time.sleep(WAIT_TIME)
+            log.debug("Scanning Page %d...", page)
             
-            # Implementation of the retry logic for network stability
-            for attempt in range(TRIES):  
-                try:
-                    response = requests.post(self.api_url, json=payload, headers=self.headers, timeout=15)
+            announcements = self.fetch_search_page(category_slug, page)
+            scanned_pages += 1
+            if announcements is None:
+                # Its listings are older than the newest one seen: the caller must not advance the watermark past them
+                failed_pages.append(page)
+                # Without a known page count we cannot tell whether more pages exist
+                if last_page is None:
                     break
-                except Exception as e:
-                    print(f"Error on page {page} (attempt {attempt + 1}/{TRIES}): {e}")
-                    
-                    if attempt < TRIES - 1:
-                        time.sleep(WAIT_TIME_RETRY)
-                    else:
-                        print(f"Failed to fetch page {page} after {TRIES} attempts.")
-                        continue
-
-            if response.status_code != 200:
-                print(f"Skip: HTTP {response.status_code} on page {page}.")
+                page += 1
                 continue
             
-            try:
-                data = response.json()
-                announcements = data["data"]["search"]["announcements"]["data"]
-                
-                if not announcements:
-                    print(f"End of data reached at page {page}.")
-                    break                
-
-                # Collect IDs from the current page
-                for announcement in announcements:
-                    all_ids.add(announcement["id"])
+            paginator = announcements["paginatorInfo"]
+            if paginator.get("lastPage"):
+                last_page = min(last_page, paginator["lastPage"]) if last_page else paginator["lastPage"]
+            
+            fresh_count = 0
+            covered_count = 0
+            for announcement in announcements["data"]:
+                ann_id = announcement["id"]
+                refreshed_at = announcement.get("refreshedAt")
                 
-                # Dynamic pagination check
-                paginator = data["data"]["search"]["announcements"]["paginatorInfo"]
-                has_more = paginator.get("hasMorePages", False)
+                # Older than the watermark, or at the watermark and already seen
+                if mark_time and refreshed_at and (refreshed_at < mark_time or (refreshed_at == mark_time and ann_id in mark_ids)):
+                    covered_count += 1
+                    continue
                 
-                print(f"Progress: {len(all_ids)} IDs found so far.")
+                new_ids[ann_id] = None
+                if str(ann_id) not in known_ids and (shard is None or ann_id in shard):
+                    fresh_count += 1
                 
-                if not has_more:
-                    break
+                if refreshed_at and (newest_time is None or refreshed_at > newest_time):
+                    newest_time, newest_ids = refreshed_at, {ann_id}
+                elif refreshed_at and refreshed_at == newest_time:
+                    newest_ids.add(ann_id)
             
-                time.sleep(WAIT_TIME)
-                
-            except (KeyError, TypeError) as e:
-                print(f"Data format error on page {page}: {e}")
-                
-        print(f"ID extraction completed. {len(all_ids)} total unique IDs found.")
-        return all_ids
+            log.info("Progress: %d IDs past the watermark, %d new on page %d.", len(new_ids), fresh_count, page)
+            
+            if not announcements["data"] or not paginator.get("hasMorePages", False):
+                break
+            
+            # After a scan that lost pages, known listings may still hide unfetched ones further down
+            if fresh_count == 0 and (not rescan or covered_count == len(announcements["data"])):
+                stale_pages += 1
+            else:
+                stale_pages = 0
+            if stale_pages >= stop_pages:
+                log.info("Only known listings for %d page(s), stopping early at page %d.", stale_pages, page)
+                break
+            
+            page += 1
+        
+        if failed_pages:
+            log.warning("Pages failed during the incremental scan: %s.", failed_pages)
+        log.info("Incremental extraction completed. %d IDs found.", len(new_ids),
+                 extra=fields(pages=scanned_pages, ids=len(new_ids), failed_pages=len(failed_pages)))
+        return list(new_ids), {"refreshed_at": newest_time, "ids": sorted(newest_ids)}, failed_pages
+
+
+    def _scan_pages_sequential(self, category_slug, first_page, max_pages, all_ids):
+        """
+        Walks pages 2..max_pages strictly in order, stopping at the end of data.
+        """
+        if not first_page["paginatorInfo"].get("hasMorePages", False):
+            return
+        
+        for page in range(2, max_pages + 1):
+            time.sleep(WAIT_TIME)
+            log.debug("Scanning Page %d...", page)
+            
+            announcements = self.fetch_search_page(category_slug, page)
+            if announcements is None:
+                continue
+            
+            if not announcements["data"]:
+                log.info("End of data reached at page %d.", page)
+                break
+            
+            # Collect IDs from the current page
+            for announcement in announcements["data"]:
+                all_ids[announcement["id"]] = None
+            
+            log.info("Progress: %d IDs found so far.", len(all_ids))
+            
+            # Dynamic pagination check
+            if not announcements["paginatorInfo"].get("hasMorePages", False):
+                break
+
+
+    def _scan_pages_snapshot(self, category_slug, first_page, max_pages, all_ids, overlap=SCAN_OVERLAP):
+        """
+        Walks pages 2..max_pages in order, checking every page boundary for drift.
+        Results keep moving during a long scan: a listing refreshed below the cursor jumps to
+        the top and pushes the others one position down (the next page repeats a listing),
+        a listing removed above the cursor pulls them up (the next page starts one listing
+        late and one is skipped).
+        Each page request also re-reads the last `overlap` listings of the previous page:
+        unseen IDs there moved up across the boundary and are kept. If all of them are unseen,
+        the shift is larger than the overlap and earlier pages are re-fetched until they meet
+        listings already seen. Listings refreshed during the scan (newer than page 1 was at
+        the start) are collected from the top pages at the end.
+        
+        Returns:
+            dict: Drift report: {"duplicates", "recovered", "refreshed", "refetched_pages"}.
+        """
+        if COUNT % overlap:
+            raise ValueError(f"SCAN_OVERLAP ({overlap}) must divide COUNT ({COUNT}).")
+        
+        report = {"duplicates": 0, "recovered": 0, "refreshed": 0, "refetched_pages": 0}
+        # The scan covers the results as of its start: everything refreshed up to page 1's newest listing
+        pinned_at = max((announcement.get("refreshedAt") or "" for announcement in first_page["data"]), default="")
+        
+        def collect(announcements):
+            new_ids = [announcement["id"] for announcement in announcements if announcement["id"] not in all_ids]
+            all_ids.update(dict.fromkeys(new_ids))
+            return len(new_ids)
+        
+        def refetch_back(page):
+            # Re-reads pages page, page - 1, ... until one holds listings already seen
+            for back in range(page, 0, -1):
+                announcements = self.fetch_search_page(category_slug, back)
+                report["refetched_pages"] += 1
+                if not announcements or not announcements["data"]:
+                    return 0
+                new_count = collect(announcements["data"])
+                if new_count < len(announcements["data"]):
+                    return new_count
+            return 0
+        
+        previous_ok = True
+        pages = range(2, max_pages + 1) if first_page["paginatorInfo"].get("hasMorePages", False) else []
+        for page in pages:
+            time.sleep(WAIT_TIME)
+            log.debug("Scanning Page %d (overlap %d)...", page, overlap)
+            
+            announcements = self.fetch_search_page(category_slug, page, overlap)
+            if announcements is None:
+                previous_ok = False
+                continue
+            
+            if not previous_ok:
+                # The previous page failed: read it now, its boundary has nothing to compare against
+                refetch_back(page - 1)
+                previous_ok = True
+            else:
+                moved_up = collect(announcements["previous"])
+                if moved_up == len(announcements["previous"]) and moved_up:
+                    moved_up += refetch_back(page - 1)
+                report["recovered"] += moved_up
+            
+            page_data = announcements["data"]
+            report["duplicates"] += sum(1 for announcement in page_data if announcement["id"] in all_ids)
+            collect(page_data)
+            log.info("Progress: %d IDs found so far.", len(all_ids))
+            
+            if not page_data:
+                log.info("End of data reached at page %d.", page)
+                break
+            if not announcements["paginatorInfo"].get("hasMorePages", False):
+                break
+        
+        # Listings refreshed during the scan jumped above the cursor: collect them from the top
+        for page in range(1, max_pages + 1):
+            announcements = self.fetch_search_page(category_slug, page)
+            if announcements is None:
+                break
+            page_data = announcements["data"]
+            report["refreshed"] += collect([announcement for announcement in page_data
+                                            if (announcement.get("refreshedAt") or "") > pinned_at])
+            if any((announcement.get("refreshedAt") or "") <= pinned_at for announcement in page_data):
+                break
+            if not announcements["paginatorInfo"].get("hasMorePages", False):
+                break
+        
+        for kind, count in report.items():
+            metrics.inc("scan_drift_total", count, kind=kind)
+        log.info("Snapshot scan: %d duplicated, %d shifted across page boundaries (recovered, %d page(s) re-fetched), "
+                 "%d refreshed during the scan (collected).", report["duplicates"], report["recovered"],
+                 report["refetched_pages"], report["refreshed"], extra=fields(**report))
+        return report
+
+
+    def _scan_pages_parallel(self, category_slug, pages, all_ids):
+        """
+        Fetches a known page range on a worker pool under the shared rate limit.
+        Pages that fail are re-fetched in a second round, then IDs are merged in page order.
+        """
+        page_ids = {}
+        
+        def scan(page_list):
+            failed = []
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                futures = {executor.submit(self.fetch_search_page, category_slug, page): page for page in page_list}
+                for future in as_completed(futures):
+                    page = futures[future]
+                    try:
+                        announcements = future.result()
+                    except CircuitOpenError:
+                        raise
+                    except Exception as e:
+                        log.error("Worker error on page %d: %s", page, e)
+                        announcements = None
+                    
+                    if announcements is None:
+                        failed.append(page)
+                        continue
+                    
+                    page_ids[page] = [announcement["id"] for announcement in announcements["data"]]
+                    log.debug("Scanned page %d (%d/%d pages done).", page, len(page_ids), len(pages))
+            return failed
+        
+        failed = scan(list(pages))
+        if failed:
+            log.warning("Re-fetching %d failed page(s)...", len(failed))
+            metrics.inc("retries_total", len(failed), operation="SearchQuery", reason="page")
+            time.sleep(WAIT_TIME_RETRY)
+            failed = scan(sorted(failed))
+        if failed:
+            log.error("Pages still failing after retry: %s", sorted(failed))
+        
+        for page in sorted(page_ids):
+            for ann_id in page_ids[page]:
+                all_ids[ann_id] = None
 
 
     def get_announcement_details(self, ann_id):
@@ -108,21 +487,109 @@ class OuedKnissAPI:
         Returns:
             dict: Parsed announcement data.
         """
-        payload = get_payload_post(ann_id)
+        response = self._post(get_payload_post(ann_id, ANNOUNCEMENT_FIELDS), DETAIL_TIMEOUT, f"ID {ann_id}")
+        if response is None:
+            return None
         
-        for attempt in range(TRIES):
-            try:
-                response = requests.post(self.api_url, json=payload, headers=self.headers, timeout=10)
-                
-                if response.status_code != 200:
-                    print(f"Error for ID {ann_id}: HTTP {response.status_code}")
-                    return None
-                
-                return response.json()["data"]["announcement"]
-                
-            except Exception as e:
-                print(f"Connection error for ID {ann_id} (attempt {attempt + 1}/{TRIES}): {e}")
-                if attempt < TRIES - 1:
-                    time.sleep(WAIT_TIME_RETRY)
-                else:
-                    return None
+        try:
+            return json_loads(response.content)["data"]["announcement"]
+        except (KeyError, TypeError, ValueError) as e:
+            log.warning("Data format error for ID %s: %s", ann_id, e)
+            return None
+
+
+    def get_announcement_details_batch(self, ann_ids, fields=None):
+        """
+        Fetches full details for several announcements in a single request,
+        using one aliased announcementDetails field per ID.
+        
+        Args:
+            ann_ids (list): The announcement IDs.
+            fields (str, optional): Field selection, ANNOUNCEMENT_FIELDS by default
+                                    (e.g. query_builder.entity_fields for store/user backfills).
+            
+        Returns:
+            dict: {ann_id: raw_data}. raw_data is None for IDs that failed,
+                  either because the whole request failed or because the
+                  server reported an error for that alias only.
+        """
+        ann_ids = list(ann_ids)
+        payload = get_payload_post_batch(ann_ids, fields or ANNOUNCEMENT_FIELDS)
+        results = {ann_id: None for ann_id in ann_ids}
+        
+        response = self._post(payload, DETAIL_TIMEOUT, f"batch of {len(ann_ids)} IDs")
+        if response is None:
+            return results
+        
+        try:
+            body = json_loads(response.content)
+        except ValueError as e:
+            log.warning("Data format error for batch of %d IDs: %s", len(ann_ids), e)
+            return results
+        
+        # Partial errors: GraphQL reports them per alias through the error path
+        for error in body.get("errors") or []:
+            path = error.get("path") or []
+            alias = path[0] if path else None
+            if isinstance(alias, str) and alias[1:].isdigit() and int(alias[1:]) < len(ann_ids):
+                log.warning("Error for ID %s: %s", ann_ids[int(alias[1:])], error.get('message'))
+                metrics.inc("graphql_errors_total", scope="alias")
+            else:
+                log.warning("Batch error: %s", error.get('message'))
+                metrics.inc("graphql_errors_total", scope="batch")
+        
+        data = body.get("data") or {}
+        for i, ann_id in enumerate(ann_ids):
+            results[ann_id] = data.get(f"a{i}")
+        return results
+
+
+    def get_announcement_details_concurrent(self, ann_ids, max_workers=MAX_WORKERS, batch_size=BATCH_SIZE):
+        """
+        Fetches details for many announcements with several requests in flight.
+        All workers share this client's rate limiter, and at most `max_workers * 2`
+        requests are queued at any time so memory stays flat for very long ID lists.
+        
+        Args:
+            ann_ids (iterable): The announcement IDs to fetch.
+            max_workers (int): Maximum number of simultaneous detail requests.
+            batch_size (int): IDs packed into each request (1 = one request per ID).
+            
+        Yields:
+            tuple: (ann_id, raw_data) in completion order. raw_data is None on failure.
+        """
+        ann_ids = iter(ann_ids)
+        
+        def fetch_chunk(chunk):
+            if len(chunk) == 1:
+                return {chunk[0]: self.get_announcement_details(chunk[0])}
+            return self.get_announcement_details_batch(chunk)
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = {}
+            
+            # Keep a bounded window of submitted requests
+            def fill():
+                while len(pending) < max_workers * 2:
+                    chunk = list(islice(ann_ids, max(batch_size, 1)))
+                    if not chunk:
+                        return
+                    pending[executor.submit(fetch_chunk, chunk)] = chunk
+            
+            fill()
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunk = pending.pop(future)
+                    try:
+                        results = future.result()
+                    except CircuitOpenError:
+                        # The API has been down too long: stop instead of failing every remaining ID
+                        raise
+                    except Exception as e:
+                        # A single failure must never stall the rest of the batch
+                        log.error("Worker error for IDs %s: %s", chunk, e)
+                        results = {}
+                    for ann_id in chunk:
+                        yield ann_id, results.get(ann_id)
+                fill()
@@ -0,0 +1,80 @@
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+"""
+Inter-Process File Locking.
+Shards running as separate processes share the tracking store, the watermark file
+and the spec registry; every read-modify-write of those files happens under an
+exclusive lock on a companion `<file>.lock`.
+"""
+
+
+class FileLock:
+    """
+    Exclusive lock held across processes (flock / msvcrt) and across threads.
+    Reentrant within a thread, so locked methods may call each other.
+
+    Usage:
+        with FileLock("scraped_ids.lock"):
+            ...
+    """
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                self._file = open(self.path, 'a+b')
+                self._lock_file()
+            except BaseException:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            self._unlock_file()
+            self._file.close()
+            self._file = None
+        self._thread_lock.release()
+
+    def _lock_file(self):
+        if fcntl:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            return
+        # msvcrt.locking gives up after ~10 seconds; keep waiting like flock does
+        self._file.seek(0)
+        while True:
+            try:
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                continue
+
+    def _unlock_file(self):
+        if fcntl:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
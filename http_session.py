@@ -0,0 +1,105 @@
+import time
+import threading
+import requests
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from settings import HEADER, POOL_CONNECTIONS, POOL_MAXSIZE
+from metrics import metrics
+from log import get_logger
+
+"""
+Shared HTTP Session Layer.
+Owns the keep-alive connection pools used by the API client and the image downloader,
+so TCP/TLS handshakes are paid once per connection instead of once per request.
+"""
+
+log = get_logger("http")
+
+
+class HTTPSession:
+    """
+    Thin wrapper around requests.Session with per-host connection pools.
+    Safe to share between the worker threads of a single run.
+    """
+    def __init__(self, pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, headers=None):
+        self.session = requests.Session()
+        self.session.headers.update(headers or HEADER)
+
+        # pool_connections = number of hosts kept cached, pool_maxsize = sockets kept per host
+        self.adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+
+    def request(self, method, url, **kwargs):
+        """
+        Sends a request and records its status code and latency (time to response headers).
+        GraphQL calls are labelled by operationName, everything else by host.
+        """
+        payload = kwargs.get("json")
+        operation = payload.get("operationName") if isinstance(payload, dict) else None
+        operation = operation or urlsplit(url).netloc
+
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except Exception as e:
+            metrics.inc("http_errors_total", operation=operation, error=type(e).__name__)
+            raise
+        metrics.observe("http_request_seconds", time.perf_counter() - start, operation=operation)
+        metrics.inc("http_responses_total", operation=operation, status=response.status_code)
+        return response
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.request("HEAD", url, **kwargs)
+
+    def connection_stats(self):
+        """
+        Reports connection reuse for every host pool currently alive.
+
+        Returns:
+            dict: {host: {"requests": int, "connections": int, "reused": int}}
+        """
+        stats = {}
+        pools = self.adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = f"{pool.host}:{pool.port}"
+            entry = stats.setdefault(host, {"requests": 0, "connections": 0, "reused": 0})
+            entry["requests"] += pool.num_requests
+            entry["connections"] += pool.num_connections
+
+        for entry in stats.values():
+            entry["reused"] = max(entry["requests"] - entry["connections"], 0)
+        return stats
+
+    def print_stats(self):
+        for host, entry in self.connection_stats().items():
+            log.info("  %s: %d requests over %d connection(s) (%d reused)",
+                     host, entry['requests'], entry['connections'], entry['reused'])
+
+    def close(self):
+        self.session.close()
+
+
+_default_session = None
+_default_lock = threading.Lock()
+
+
+def get_default_session():
+    """
+    Returns the process-wide session, creating it on first use.
+    Components that are not handed an explicit session fall back to this one.
+    """
+    global _default_session
+    with _default_lock:
+        if _default_session is None:
+            _default_session = HTTPSession()
+        return _default_session
@@ -0,0 +1,257 @@
+import os
+import mmap
+import math
+import bisect
+import heapq
+import threading
+from array import array
+from settings import TRACKING_FILE, TRACKING_STORE, TRACKING_BLOOM, TRACKING_COMPACT_THRESHOLD
+from file_lock import FileLock
+from log import get_logger
+
+"""
+Compact Scraped-ID Tracking Store.
+Replaces the one-string-per-line set loaded from scraped_ids.txt with:
+  - <store>.bin   : sorted, de-duplicated int64 IDs, memory-mapped (8 bytes per ID)
+  - <store>.delta : int64 IDs appended since the last compaction
+  - <store>.bloom : optional Bloom filter answering most "not seen yet" lookups without touching the array
+"""
+
+log = get_logger("id_store")
+
+_HASH_MUL_1 = 0x9E3779B97F4A7C15
+_HASH_MUL_2 = 0xC2B2AE3D27D4EB4F
+_MASK_64 = (1 << 64) - 1
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over integer IDs, using double hashing.
+    """
+    def __init__(self, capacity, error_rate=0.01, bits=None, num_hashes=None, data=None):
+        capacity = max(capacity, 1024)
+        self.num_bits = bits or int(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        self.num_hashes = num_hashes or max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray(data) if data is not None else bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, value):
+        h1 = (value * _HASH_MUL_1) & _MASK_64
+        h2 = ((value * _HASH_MUL_2) & _MASK_64) | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, value):
+        for pos in self._positions(value):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, value):
+        for pos in self._positions(value):
+            if not self.bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def save(self, filename):
+        header = array('q', [self.num_bits, self.num_hashes])
+        with open(filename, 'wb') as f:
+            f.write(header.tobytes())
+            f.write(self.bits)
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, 'rb') as f:
+            header = array('q')
+            header.frombytes(f.read(header.itemsize * 2))
+            return cls(0, bits=header[0], num_hashes=header[1], data=f.read())
+
+
+class ScrapedIDStore:
+    """
+    Set-like store of scraped announcement IDs.
+    Supports `str(ann_id) in store`, backed by a sorted ID file plus an append-only delta.
+    Thread-safe, so concurrently scraped categories can share one instance, and
+    shard processes can share the files: writes and compactions take `<store>.lock`.
+    """
+    def __init__(self, path=TRACKING_STORE, use_bloom=TRACKING_BLOOM,
+                 compact_threshold=TRACKING_COMPACT_THRESHOLD, legacy_file=TRACKING_FILE):
+        self.base_path = f"{path}.bin"
+        self.delta_path = f"{path}.delta"
+        self.bloom_path = f"{path}.bloom"
+        self.use_bloom = use_bloom
+        self.compact_threshold = compact_threshold
+        # Reentrant: add_many checks membership while holding it
+        self._lock = threading.RLock()
+        self._file_lock = FileLock(f"{path}.lock")
+
+        self._mmap = None
+        self._base = ()
+        self.bloom = None
+
+        with self._file_lock:
+            if not os.path.exists(self.base_path):
+                self._migrate(legacy_file)
+
+            self._open_base()
+            self.delta = self._read_delta()
+            self._open_bloom()
+
+    # --- Loading ---
+
+    def _migrate(self, legacy_file):
+        """
+        One-time conversion of the plain text tracking file into the binary store.
+        The text file itself is left untouched.
+        """
+        ids = array('q')
+        if legacy_file and os.path.exists(legacy_file):
+            with open(legacy_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if line.isdigit():
+                        ids.append(int(line))
+            log.info("Migrating %d IDs from %s to %s...", len(ids), legacy_file, self.base_path)
+
+        self._write_base(sorted(ids))
+
+    def _open_base(self):
+        if os.path.getsize(self.base_path) == 0:
+            self._base = ()
+            return
+        with open(self.base_path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._base = memoryview(self._mmap).cast('q')
+
+    def _close_base(self):
+        if isinstance(self._base, memoryview):
+            self._base.release()
+        self._base = ()
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def _read_delta(self):
+        delta = array('q')
+        if os.path.exists(self.delta_path):
+            with open(self.delta_path, 'rb') as f:
+                data = f.read()
+            # Ignore a torn trailing record from an interrupted append
+            usable = len(data) - len(data) % delta.itemsize
+            delta.frombytes(data[:usable])
+        return set(delta)
+
+    def _open_bloom(self):
+        if not self.use_bloom:
+            self.bloom = None
+            return
+
+        if os.path.exists(self.bloom_path):
+            self.bloom = BloomFilter.load(self.bloom_path)
+        else:
+            self.bloom = BloomFilter(len(self._base) + self.compact_threshold)
+            for value in self._base:
+                self.bloom.add(value)
+            self.bloom.save(self.bloom_path)
+
+        for value in self.delta:
+            self.bloom.add(value)
+
+    # --- Queries ---
+
+    def __contains__(self, ann_id):
+        try:
+            value = int(ann_id)
+        except (TypeError, ValueError):
+            return False
+
+        with self._lock:
+            if self.bloom is not None and value not in self.bloom:
+                return False
+            if value in self.delta:
+                return True
+
+            index = bisect.bisect_left(self._base, value)
+            return index < len(self._base) and self._base[index] == value
+
+    def __len__(self):
+        # Delta entries may duplicate base entries until the next compaction
+        return len(self._base) + len(self.delta)
+
+    # --- Updates ---
+
+    def add_many(self, ann_ids):
+        """
+        Appends a batch of IDs in a single write, forced to disk before returning.
+        Triggers a compaction once the delta grows past the configured threshold.
+        """
+        with self._lock, self._file_lock:
+            values = array('q', (value for value in dict.fromkeys(int(ann_id) for ann_id in ann_ids) if value not in self))
+            if not values:
+                return
+
+            with open(self.delta_path, 'ab') as f:
+                f.write(values.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            self.delta.update(values)
+            if self.bloom is not None:
+                for value in values:
+                    self.bloom.add(value)
+
+            if len(self.delta) >= self.compact_threshold:
+                self.compact()
+
+    def add(self, ann_id):
+        self.add_many([ann_id])
+
+    def compact(self):
+        """
+        Merges the delta into the sorted base file and rebuilds the Bloom filter.
+        """
+        with self._lock, self._file_lock:
+            # Other processes sharing the store may have appended or compacted since it was loaded
+            self._close_base()
+            self._open_base()
+            self.delta = self._read_delta()
+
+            temp_name = self._write_base(heapq.merge(self._base, sorted(self.delta)), replace=False)
+            self._close_base()
+            os.replace(temp_name, self.base_path)
+
+            if os.path.exists(self.delta_path):
+                os.remove(self.delta_path)
+            if os.path.exists(self.bloom_path):
+                os.remove(self.bloom_path)
+
+            self._open_base()
+            self.delta = set()
+            self._open_bloom()
+
+    def _write_base(self, sorted_ids, replace=True):
+        """
+        Streams sorted IDs to a temp file, dropping duplicates, then swaps it in.
+        With replace=False the temp file name is returned for the caller to swap.
+        """
+        temp_name = f"{self.base_path}.tmp"
+        with open(temp_name, 'wb') as f:
+            chunk = array('q')
+            last = None
+            for value in sorted_ids:
+                if value == last:
+                    continue
+                chunk.append(value)
+                last = value
+                if len(chunk) >= 65536:
+                    f.write(chunk.tobytes())
+                    chunk = array('q')
+            f.write(chunk.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+        if not replace:
+            return temp_name
+        os.replace(temp_name, self.base_path)
+        return self.base_path
+
+    def close(self):
+        with self._lock:
+            self._close_base()
@@ -0,0 +1,113 @@
+import os
+from datetime import datetime
+from settings import JOURNAL_DIR
+from json_backend import dumps, loads
+
+"""
+Write-Ahead Session Journal.
+Every fetched raw response is appended to an on-disk journal the moment it arrives,
+so a crash, Ctrl-C or network outage never loses work that was already paid for.
+A restarted run replays the journal and only fetches what is still missing.
+"""
+
+
+class SessionJournal:
+    """
+    Append-only JSON-lines journal for one scrape session.
+
+    Record types:
+        "session": header written once, holds the category and the target ID list.
+        "detail":  one raw announcementDetails response.
+        "commit":  written after the CSV export and tracking update succeeded.
+    """
+    def __init__(self, session_id, directory=JOURNAL_DIR):
+        self.session_id = session_id
+        self.path = os.path.join(directory, f"{session_id}.jsonl")
+        self.journalfile = None
+
+    @staticmethod
+    def new_session_id(category_slug):
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return f"{category_slug.replace('-', '_')}_{timestamp}"
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def _open(self):
+        if self.journalfile is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self.journalfile = open(self.path, 'a', encoding='utf-8')
+
+    def _write(self, record):
+        self._open()
+        self.journalfile.write(dumps(record) + "\n")
+        self.journalfile.flush()
+        # Force the record to disk so it survives a crash of the whole machine
+        os.fsync(self.journalfile.fileno())
+
+    def start(self, category_slug, target_ids, **extra):
+        """
+        Writes the session header. Extra keyword arguments are stored as-is
+        and returned by read_header() when the session is resumed.
+        """
+        self._write({"type": "session", "category": category_slug, "target_ids": list(target_ids), **extra})
+
+    def append(self, ann_id, raw_data):
+        self._write({"type": "detail", "id": ann_id, "data": raw_data})
+
+    def mark_committed(self):
+        self._write({"type": "commit"})
+
+    def _records(self):
+        if not self.exists():
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield loads(line)
+                except ValueError:
+                    # A torn final line from an interrupted write; everything before it is intact
+                    return
+
+    def read_header(self):
+        for record in self._records():
+            if record.get("type") == "session":
+                return record
+        return None
+
+    def is_committed(self):
+        return any(record.get("type") == "commit" for record in self._records())
+
+    def replay(self):
+        """
+        Yields (ann_id, raw_data) for every detail already stored in the journal.
+        """
+        for record in self._records():
+            if record.get("type") == "detail":
+                yield record["id"], record["data"]
+
+    def close(self):
+        if self.journalfile:
+            self.journalfile.close()
+            self.journalfile = None
+
+    def discard(self):
+        self.close()
+        if self.exists():
+            os.remove(self.path)
+
+
+def list_open_sessions(directory=JOURNAL_DIR):
+    """
+    Returns the IDs of journaled sessions that were never committed.
+    """
+    if not os.path.exists(directory):
+        return []
+
+    sessions = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".jsonl"):
+            journal = SessionJournal(name[:-len(".jsonl")], directory)
+            if not journal.is_committed():
+                sessions.append(journal.session_id)
+    return sessions
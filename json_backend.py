@@ -0,0 +1,77 @@
+import json
+from settings import JSON_BACKEND
+
+try:
+    import orjson
+except ImportError:
+    # Optional: pip install orjson
+    orjson = None
+
+"""
+Pluggable JSON Backend.
+Every API response is decoded, journaled and cached as JSON, which shows up in profiles
+once requests run concurrently. This module picks the fastest available implementation
+(orjson when installed, the standard library otherwise); responses are decoded straight
+from their raw bytes instead of going through `response.json()` and a decoded text copy.
+"""
+
+
+class JSONBackend:
+    """
+    One JSON implementation. Encoders keep non-ASCII characters as-is,
+    like json.dumps(..., ensure_ascii=False).
+
+    Args:
+        name (str): Name shown in logs and benchmarks.
+        loads (callable): bytes or str -> object.
+        dumps (callable): object -> str.
+        dumps_bytes (callable): object -> UTF-8 bytes.
+    """
+    def __init__(self, name, loads, dumps, dumps_bytes):
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+        self.dumps_bytes = dumps_bytes
+
+
+def _stdlib_dumps(value):
+    return json.dumps(value, ensure_ascii=False)
+
+
+STDLIB = JSONBackend("stdlib", json.loads, _stdlib_dumps, lambda value: _stdlib_dumps(value).encode('utf-8'))
+
+if orjson is not None:
+    # Non-string keys are converted like the standard library does, instead of raising
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+    ORJSON = JSONBackend("orjson", orjson.loads,
+                         lambda value: orjson.dumps(value, option=_ORJSON_OPTIONS).decode('utf-8'),
+                         lambda value: orjson.dumps(value, option=_ORJSON_OPTIONS))
+else:
+    ORJSON = None
+
+
+def get_backend(name=JSON_BACKEND):
+    """
+    Resolves a JSON_BACKEND setting.
+
+    Args:
+        name (str): "AUTO" (orjson if installed, else stdlib), "ORJSON" or "STDLIB".
+
+    Returns:
+        JSONBackend: The selected implementation.
+    """
+    if name == "AUTO":
+        return ORJSON or STDLIB
+    if name == "STDLIB":
+        return STDLIB
+    if name == "ORJSON":
+        if ORJSON is None:
+            raise ImportError("JSON_BACKEND = \"ORJSON\" requires the orjson package (pip install orjson).")
+        return ORJSON
+    raise ValueError(f"Unknown JSON backend: {name}")
+
+
+backend = get_backend()
+loads = backend.loads
+dumps = backend.dumps
+dumps_bytes = backend.dumps_bytes
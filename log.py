@@ -0,0 +1,92 @@
+import sys
+import json
+import logging
+from datetime import datetime
+from settings import LOG_LEVEL, LOG_FORMAT
+
+"""
+Leveled, Structured Logging.
+Every module logs through a child of the "ouedkniss" logger instead of print(), so a
+run's verbosity is a single setting (LOG_LEVEL) and messages below it cost nothing
+beyond the level check. LOG_FORMAT="JSON" emits one JSON object per line.
+"""
+
+ROOT_LOGGER = "ouedkniss"
+
+
+class TextFormatter(logging.Formatter):
+    """
+    Human-readable lines; structured fields are appended as key=value pairs.
+    """
+    def format(self, record):
+        message = record.getMessage()
+        fields = getattr(record, "fields", None)
+        if fields:
+            message += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        if record.levelno >= logging.WARNING:
+            message = f"[{record.levelname}] {message}"
+        if record.exc_info:
+            message += "\n" + self.formatException(record.exc_info)
+        return message
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    One JSON object per line: time, level, logger, message and any structured fields.
+    """
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, stream=None):
+    """
+    (Re)configures the "ouedkniss" logger. Safe to call more than once.
+
+    Args:
+        level (str): "DEBUG", "INFO", "WARNING" or "ERROR".
+        fmt (str): "TEXT" or "JSON".
+        stream (file, optional): Destination, stdout by default.
+    """
+    logger = logging.getLogger(ROOT_LOGGER)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(JSONFormatter() if fmt == "JSON" else TextFormatter())
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+    return logger
+
+
+def get_logger(name):
+    """
+    Returns the logger of a module, configuring logging from settings on first use.
+    """
+    if not logging.getLogger(ROOT_LOGGER).handlers:
+        setup_logging()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def fields(**values):
+    """
+    Structured fields for a log call: `log.info("Page scanned", extra=fields(page=3))`.
+    """
+    return {"fields": values}
+
+
+def bind(logger, **values):
+    """
+    Logger adding the same structured fields to every message, e.g. the category of
+    one of several categories scraped at the same time.
+    """
+    return logging.LoggerAdapter(logger, fields(**values))
@@ -1,8 +1,17 @@
-from scraper import scrape_ouedkniss
+import sys
+from scraper import scrape_ouedkniss, scrape_categories, export_from_cache
+from sharding import Shard, launch_shards
 
 """
 Main Application Entry Point.
 Configure the target category and execution limits here.
+
+Usage:
+    python main.py             Scrape the target category.
+    python main.py --offline   Rebuild the CSV from the raw response cache only.
+    python main.py --all       Scrape every category of CATEGORIES (settings.py) in one process.
+    python main.py --shard 0/4 Run as shard 0 of 4 instead of SHARD_INDEX/SHARD_COUNT (settings.py).
+    python main.py --shards 4  Run all 4 shards of the target category as local processes.
 """
 
 if __name__ == "__main__":
@@ -15,11 +24,43 @@ if __name__ == "__main__":
     # Change to None to scan the entire category catalog.
     max_scan_pages = 10  # None = scan ALL pages in the category
     
-    print(f"--- Starting OuedKniss Scraper Session ---")
-    print(f"Target: {target_category}")
+    # RESUME: Set to the session ID printed by an interrupted run to finish it
+    # without re-fetching what was already journaled. None starts a new session.
+    resume_session_id = None
+    
+    if "--offline" in sys.argv:
+        print("--- Offline Re-Export (no API calls) ---")
+        print(f"Target: {target_category}")
+        result_file = export_from_cache(target_category)
+        print(f"\nRe-export complete: {result_file}" if result_file else "\nNothing to re-export.")
+        sys.exit(0)
+    
+    # SHARD: Which part of the ID space this process fetches (see SHARD_* in settings.py)
+    shard = Shard()
+    if "--shard" in sys.argv:
+        shard = Shard.parse(sys.argv[sys.argv.index("--shard") + 1])
+    
+    if "--shards" in sys.argv:
+        shard_count = int(sys.argv[sys.argv.index("--shards") + 1])
+        print(f"--- Starting {shard_count} OuedKniss Shard Processes ---")
+        print(f"Target: {target_category}")
+        results = launch_shards(target_category, max_scan_pages, shard_count)
+        for shard_name, result_file in results.items():
+            print(f"Shard {shard_name}: {result_file or 'no new data'}")
+        sys.exit(0)
+    
+    if "--all" in sys.argv:
+        print("--- Starting OuedKniss Multi-Category Session ---")
+        results = scrape_categories(shard=shard)
+        exported = [filename for filename in results.values() if filename]
+        print(f"\nSession Complete. {len(exported)}/{len(results)} categories exported new data.")
+        sys.exit(0)
+    
+    print("--- Starting OuedKniss Scraper Session ---")
+    print(f"Target: {target_category} (shard {shard})")
     
     # Execute the scraper
-    result_file = scrape_ouedkniss(category_slug=target_category, max_pages=max_scan_pages)
+    result_file = scrape_ouedkniss(category_slug=target_category, max_pages=max_scan_pages, session_id=resume_session_id, shard=shard)
     
     if result_file:
         print(f"\nSession Complete. Data exported to: {result_file}")
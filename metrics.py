@@ -0,0 +1,208 @@
+import os
+import json
+import math
+import time
+import threading
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+"""
+Run Metrics.
+Counters, gauges and latency histograms per stage (pages scanned, details fetched, retries,
+HTTP status codes, bytes downloaded, rows written...), exported as a per-run JSON
+summary and in the Prometheus text format (file and/or a small /metrics endpoint).
+"""
+
+PREFIX = "ouedkniss_"
+
+# Upper bounds in seconds, from fast local calls to slow CDN downloads
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, math.inf)
+
+
+def _key(name, labels):
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _series(name, labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return name
+    return name + "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+
+class Metrics:
+    """
+    Thread-safe registry of counters, gauges and histograms, keyed by name and labels.
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.gauges = {}
+            self.histograms = {}
+            self.started_at = time.time()
+
+    # --- Recording ---
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self.gauges[_key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {"counts": [0] * len(self.buckets), "count": 0, "sum": 0.0, "max": 0.0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram["counts"][i] += 1
+                    break
+            histogram["count"] += 1
+            histogram["sum"] += value
+            histogram["max"] = max(histogram["max"], value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def stage(self, stage):
+        """
+        Times one pipeline stage: `with metrics.stage("scan"): ...`.
+        """
+        return self.timer("stage_seconds", stage=stage)
+
+    def value(self, name, **labels):
+        return self.counters.get(_key(name, labels), 0)
+
+    # --- Export ---
+
+    def _quantile(self, histogram, q):
+        # Upper bound of the bucket holding the q-th observation (Prometheus-style estimate)
+        rank = q * histogram["count"]
+        seen = 0
+        for bound, count in zip(self.buckets, histogram["counts"]):
+            seen += count
+            if seen >= rank and count:
+                return min(bound, histogram["max"])
+        return histogram["max"]
+
+    def summary(self):
+        """
+        Returns:
+            dict: {"duration_seconds", "counters": {series: value}, "gauges": {series: value},
+                   "histograms": {series: {"count", "sum", "mean", "p50", "p95", "max"}}}
+        """
+        with self._lock:
+            counters = {_series(name, labels): value for (name, labels), value in sorted(self.counters.items())}
+            gauges = {_series(name, labels): value for (name, labels), value in sorted(self.gauges.items())}
+            histograms = {}
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                count = histogram["count"]
+                histograms[_series(name, labels)] = {
+                    "count": count,
+                    "sum": round(histogram["sum"], 4),
+                    "mean": round(histogram["sum"] / count, 4) if count else None,
+                    "p50": round(self._quantile(histogram, 0.5), 4),
+                    "p95": round(self._quantile(histogram, 0.95), 4),
+                    "max": round(histogram["max"], 4),
+                }
+            return {
+                "duration_seconds": round(time.time() - self.started_at, 3),
+                "counters": counters,
+                "gauges": gauges,
+                "histograms": histograms,
+            }
+
+    def to_prometheus(self):
+        """
+        Renders every series in the Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {PREFIX}{name} counter")
+                    typed.add(name)
+                lines.append(f"{_series(PREFIX + name, labels)} {value}")
+
+            for (name, labels), value in sorted(self.gauges.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {PREFIX}{name} gauge")
+                    typed.add(name)
+                lines.append(f"{_series(PREFIX + name, labels)} {value}")
+
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {PREFIX}{name} histogram")
+                    typed.add(name)
+                cumulative = 0
+                for bound, count in zip(self.buckets, histogram["counts"]):
+                    cumulative += count
+                    le = "+Inf" if bound == math.inf else repr(bound)
+                    lines.append(f"{_series(PREFIX + name + '_bucket', labels, [('le', le)])} {cumulative}")
+                lines.append(f"{_series(PREFIX + name + '_sum', labels)} {histogram['sum']}")
+                lines.append(f"{_series(PREFIX + name + '_count', labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, filename, **extra):
+        """
+        Writes the run summary, plus any extra top-level fields (session ID, category...).
+        """
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump({**extra, **self.summary()}, f, indent=2, ensure_ascii=False)
+
+    def write_prometheus(self, filename):
+        """
+        Writes the text format through a temp file, as textfile collectors expect.
+        """
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+        temp_name = f"{filename}.tmp"
+        with open(temp_name, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        os.replace(temp_name, filename)
+
+    def serve(self, port, host="127.0.0.1"):
+        """
+        Serves the Prometheus text format on http://host:port/metrics from a daemon thread.
+
+        Returns:
+            ThreadingHTTPServer: Call shutdown() on it to stop serving.
+        """
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                body = registry.to_prometheus().encode("utf-8")
+                self.send_response(200 if self.path == "/metrics" else 404)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+# Process-wide registry shared by every component of a run
+metrics = Metrics()
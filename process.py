@@ -1,292 +1,688 @@
 import csv
+import json
+import os
+import sqlite3
+import tempfile
+from operator import itemgetter
+from types import MappingProxyType
+from settings import OUTPUT_COLUMNS, ENTITY_CACHE
+from file_lock import FileLock
+from log import get_logger
 
 """
 Data Transformation and CSV Management.
 This module handles the flattening of nested GraphQL responses into tabular CSV format.
 """
 
-# NOTE: If you add/remove fields in the GraphQL queries (utils.py), 
-# you MUST update the mapping logic in these classes.
+log = get_logger("process")
 
-class DataProcessorAll:
+# NOTE: If you add/remove fields in the GraphQL queries (utils.py),
+# you MUST update the FIELDS mapping below.
+
+
+class Count:
     """
-    Handles complex transformation of the 'ALL' data mode.
-    Extracts deep nested fields like city, store, and media URLs.
+    Column source giving the length of a list field, or None if the field was not queried.
+    `leaf` is the cheapest sub-field the detail query selects to get the list at all.
     """
-    def process_announcement(self, raw_data, all_spec_labels=None):
+    def __init__(self, path, leaf="id"):
+        self.path = path
+        self.selection = f"{path}.{leaf}"
+
+    def __call__(self, raw_data):
+        if self.path not in raw_data:
+            return None
+        return len(raw_data[self.path] or ())
+
+# Single declaration of every exported column: column name -> source in the API response.
+# Dotted paths walk nested objects, numeric steps index lists ("cities.0.name" = first city).
+FIELDS = {
+    # Basic identity and content
+    "id": "id",
+    "reference": "reference",
+    "title": "title",
+    "slug": "slug",
+    "description": "description",
+    "creation_date": "createdAt",
+    "created_at": "createdAt",
+    "status": "status",
+    "street_name": "street_name",
+
+    # Financials
+    "price": "price",
+    "price_preview": "pricePreview",
+    "old_price": "oldPrice",
+    "old_price_preview": "oldPricePreview",
+    "price_type": "priceType",
+    "price_unit": "priceUnit",
+    "exchange_type": "exchangeType",
+
+    # Logistics and Metadata
+    "has_delivery": "hasDelivery",
+    "delivery_type": "deliveryType",
+    "has_phone": "hasPhone",
+    "has_email": "hasEmail",
+    "quantity": "quantity",
+
+    # Categorization
+    "category_id": "category.id",
+    "category_name": "category.name",
+    "category_slug": "category.slug",
+
+    # Geographic (first city and its region)
+    "city": "cities.0.name",
+    "city_id": "cities.0.id",
+    "region": "cities.0.region.name",
+    "region_id": "cities.0.region.id",
+
+    # User Identity
+    "user_id": "user.id",
+    "username": "user.username",
+    "user_display_name": "user.displayName",
+    "avatar_url": "user.avatarUrl",
+
+    # Storefront context
+    "is_from_store": "isFromStore",
+    "store_id": "store.id",
+    "store_name": "store.name",
+    "store_slug": "store.slug",
+    "store_description": "store.description",
+    "store_image_url": "store.imageUrl",
+    "store_follower_count": "store.followerCount",
+    "store_announcements_count": "store.announcementsCount",
+    "store_status": "store.status",
+
+    # Media Summaries
+    "default_media_url": "defaultMedia.mediaUrl",
+    "default_media_type": "defaultMedia.mimeType",
+    "media_count": Count("medias", "mediaUrl"),
+
+    # Platform Features
+    "is_comment_enabled": "isCommentEnabled",
+    "no_adsense": "noAdsense",
+    "external_url": "orderExternalUrl",
+    "messenger_link": "messengerLink",
+    "show_analytics": "showAnalytics",
+    "variants_count": Count("variants"),
+}
+
+# Row layout of each extraction mode. Every mode starts with "id" (the SQLite key).
+MODE_COLUMNS = {
+    "ALL": [
+        "id", "reference", "title", "slug", "description", "creation_date",
+        "status", "street_name", "created_at",
+        "price", "price_preview", "old_price", "old_price_preview",
+        "price_type", "price_unit", "exchange_type",
+        "has_delivery", "delivery_type", "has_phone", "has_email", "quantity",
+        "category_id", "category_name", "category_slug",
+        "city", "city_id", "region", "region_id",
+        "user_id", "username", "user_display_name", "avatar_url",
+        "is_from_store", "store_id", "store_name", "store_slug",
+        "store_description", "store_image_url", "store_follower_count",
+        "store_announcements_count", "store_status",
+        "default_media_url", "default_media_type", "media_count",
+        "is_comment_enabled", "no_adsense", "external_url", "messenger_link",
+        "show_analytics", "variants_count"
+    ],
+    "MINI": ["id", "reference", "title", "description", "price_preview", "created_at", "city", "price_unit"],
+    "SUMMARY": [
+        "id", "title", "slug", "price", "price_preview", "price_unit", "price_type",
+        "created_at", "category_slug", "city", "region", "default_media_url", "media_count"
+    ],
+}
+
+# Entities exported to their own table when ENTITY_CACHE is on (prefix in FIELDS -> key column).
+# Rows then only carry the key, e.g. store_id, and join to the stores table through it.
+ENTITY_KEYS = {"store": "store_id", "user": "user_id"}
+
+_EMPTY = MappingProxyType({})
+
+
+def entity_columns(entity, columns):
+    """
+    The columns among `columns` describing an entity (e.g. store_name), its key excluded.
+    """
+    key = ENTITY_KEYS[entity]
+    return [column for column in columns
+            if column != key and isinstance(FIELDS[column], str) and FIELDS[column].startswith(f"{entity}.")]
+
+
+def mode_columns(mode, columns=OUTPUT_COLUMNS, entities=ENTITY_CACHE):
+    """
+    Columns exported in a mode: MODE_COLUMNS[mode], narrowed to `columns` when given.
+    The mode's order is kept and "id" always stays first.
+    
+    Args:
+        mode (str): "ALL", "MINI" or "SUMMARY".
+        columns (list, optional): Columns the user asked for (see OUTPUT_COLUMNS in settings.py).
+        entities (bool): Replace store/user columns by their key (see entity_tables).
+    """
+    available = MODE_COLUMNS[mode]
+    if columns:
+        unknown = [column for column in columns if column not in available]
+        if unknown:
+            raise ValueError(f"Columns not available in {mode} mode: {', '.join(unknown)}")
+        selected = [column for column in available if column == "id" or column in columns]
+    else:
+        selected = available
+    
+    if entities:
+        for entity, key in ENTITY_KEYS.items():
+            moved = entity_columns(entity, selected)
+            if moved:
+                selected = [column for column in available if (column in selected or column == key) and column not in moved]
+    return selected
+
+
+def entity_tables(mode, columns=OUTPUT_COLUMNS):
+    """
+    Layout of the entity tables written next to the rows when ENTITY_CACHE is on.
+    
+    Returns:
+        dict: {entity: [key column, *entity columns]}, e.g. {"store": ["store_id", "store_name", ...]}
+    """
+    selected = mode_columns(mode, columns, entities=False)
+    tables = {}
+    for entity, key in ENTITY_KEYS.items():
+        moved = entity_columns(entity, selected)
+        if moved:
+            tables[entity] = [key] + moved
+    return tables
+
+
+def compile_extractor(columns, fields=FIELDS):
+    """
+    Compiles a column list into one function that returns a row tuple.
+    Each nested object (e.g. `store`, `cities[0]`) is looked up once per row and kept
+    in a local, instead of repeating `raw_data.get(...)` chains for every column.
+
+    Args:
+        columns (list): Column names, all declared in `fields`.
+        fields (dict): Column name -> dotted path or callable(raw_data).
+
+    Returns:
+        function: extract(raw_data) -> tuple of values in `columns` order.
+    """
+    lines = []
+    namespace = {"_EMPTY": _EMPTY}
+    objects = {(): "raw"}
+
+    def object_at(prefix):
+        # Local variable holding the object at `prefix`, or _EMPTY when it is missing
+        if prefix in objects:
+            return objects[prefix]
+        parent = object_at(prefix[:-1])
+        step = prefix[-1]
+        name = f"o{len(objects)}"
+        if step.isdigit():
+            lines.append(f"    {name} = {parent}[{step}] or _EMPTY if len({parent}) > {step} else _EMPTY")
+        else:
+            lines.append(f"    {name} = {parent}.get({step!r}) or _EMPTY")
+        objects[prefix] = name
+        return name
+
+    values = []
+    for i, column in enumerate(columns):
+        source = fields[column]
+        if callable(source):
+            namespace[f"f{i}"] = source
+            values.append(f"f{i}(raw)")
+        else:
+            *prefix, key = source.split(".")
+            values.append(f"{object_at(tuple(prefix))}.get({key!r})")
+
+    code = "def extract(raw):\n" + "".join(line + "\n" for line in lines)
+    code += f"    return ({', '.join(values)},)\n"
+    exec(compile(code, f"<extractor {columns[0]}..{columns[-1]}>", "exec"), namespace)
+    return namespace["extract"]
+
+
+def extract_specs(raw_data):
+    """
+    Returns {label: first value} for the dynamic specifications of a listing.
+    """
+    specs = raw_data.get("specs")
+    if not specs:
+        return {}
+    return {spec["specification"]["label"]: spec["valueText"][0] if spec["valueText"] else None for spec in specs}
+
+
+def ordered_spec_labels(all_spec_labels):
+    """
+    Lists keep their order (stable columns from a SpecRegistry); sets are sorted.
+    """
+    if isinstance(all_spec_labels, list):
+        return all_spec_labels
+    return sorted(all_spec_labels)
+
+
+class DataProcessorBase:
+    """
+    Table-driven transformation shared by every mode.
+    A processed row is a `(values, specs)` pair: a tuple laid out as mode_columns(MODE)
+    and a {label: value} dict of dynamic specifications.
+    """
+    MODE = None
+
+    def __init__(self):
+        self.columns = mode_columns(self.MODE)
+        self.extract = compile_extractor(self.columns)
+
+    def process_row(self, raw_data):
         if not raw_data:
             return None
-        
-        # Mapping base API fields to a flat dictionary
-        processed_data = {
-            # Basic identity and content
-            "id": raw_data.get("id"),
-            "reference": raw_data.get("reference"),
-            "title": raw_data.get("title"),
-            "slug": raw_data.get("slug"),
-            "description": raw_data.get("description"),
-            "creation_date": raw_data.get("createdAt"),
-            "status": raw_data.get("status"),
-            "street_name": raw_data.get("street_name"),
-            
-            # Financials
-            "price": raw_data.get("price"),
-            "price_preview": raw_data.get("pricePreview"),
-            "old_price": raw_data.get("oldPrice"),
-            "old_price_preview": raw_data.get("oldPricePreview"),
-            "price_type": raw_data.get("priceType"),
-            "price_unit": raw_data.get("priceUnit"),
-            "exchange_type": raw_data.get("exchangeType"),
-            
-            # Logistics and Metadata
-            "has_delivery": raw_data.get("hasDelivery"),
-            "delivery_type": raw_data.get("deliveryType"),
-            "has_phone": raw_data.get("hasPhone"),
-            "has_email": raw_data.get("hasEmail"),
-            "quantity": raw_data.get("quantity"),
-            
-            # Categorization
-            "category_id": raw_data.get("category", {}).get("id") if raw_data.get("category") else None,
-            "category_name": raw_data.get("category", {}).get("name") if raw_data.get("category") else None,
-            "category_slug": raw_data.get("category", {}).get("slug") if raw_data.get("category") else None,
-            
-            # Geographic placeholders (filled below)
-            "city": None,
-            "city_id": None,
-            "region": None,
-            "region_id": None,
-            
-            # User Identity
-            "user_id": raw_data.get("user", {}).get("id") if raw_data.get("user") else None,
-            "username": raw_data.get("user", {}).get("username") if raw_data.get("user") else None,
-            "user_display_name": raw_data.get("user", {}).get("displayName") if raw_data.get("user") else None,
-            "avatar_url": raw_data.get("user", {}).get("avatarUrl") if raw_data.get("user") else None,
-            
-            # Storefront context
-            "is_from_store": raw_data.get("isFromStore"),
-            "store_id": None,
-            "store_name": None,
-            "store_slug": None,
-            "store_description": None,
-            "store_image_url": None,
-            "store_follower_count": None,
-            "store_announcements_count": None,
-            "store_status": None,
-            
-            # Media Summaries
-            "default_media_url": None,
-            "default_media_type": None,
-            "media_count": 0,
-            
-            # Platform Features
-            "is_comment_enabled": raw_data.get("isCommentEnabled"),
-            "no_adsense": raw_data.get("noAdsense"),
-            "external_url": raw_data.get("orderExternalUrl"),
-            "messenger_link": raw_data.get("messengerLink"),
-            "show_analytics": raw_data.get("showAnalytics"),
-            "variants_count": 0
-        }
-        
-        # Logic to flatten City and Region hierarchy
-        if raw_data.get("cities") and len(raw_data["cities"]) > 0:
-            city_data = raw_data["cities"][0]
-            processed_data["city"] = city_data.get("name")
-            processed_data["city_id"] = city_data.get("id")
-            
-            if city_data.get("region"):
-                processed_data["region"] = city_data["region"].get("name")
-                processed_data["region_id"] = city_data["region"].get("id")
-        
-        # Flattening Store detailed information
-        if raw_data.get("store"):
-            store_data = raw_data["store"]
-            processed_data["store_id"] = store_data.get("id")
-            processed_data["store_name"] = store_data.get("name")
-            processed_data["store_slug"] = store_data.get("slug")
-            processed_data["store_description"] = store_data.get("description")
-            processed_data["store_image_url"] = store_data.get("imageUrl")
-            processed_data["store_follower_count"] = store_data.get("followerCount")
-            processed_data["store_announcements_count"] = store_data.get("announcementsCount")
-            processed_data["store_status"] = store_data.get("status")
-        
-        # Extracting primary media info
-        if raw_data.get("defaultMedia"):
-            processed_data["default_media_url"] = raw_data["defaultMedia"].get("mediaUrl")
-            processed_data["default_media_type"] = raw_data["defaultMedia"].get("mimeType")
-        
-        if raw_data.get("medias"):
-            processed_data["media_count"] = len(raw_data["medias"])
-        
-        # Tracking variants for store-based listings
-        if raw_data.get("variants"):
-            processed_data["variants_count"] = len(raw_data["variants"])
-        
+        return self.extract(raw_data), extract_specs(raw_data)
+
+    def process_announcement(self, raw_data, all_spec_labels=None):
+        """
+        Dictionary form of a processed row, with spec values under spec_<label> keys.
+        """
+        row = self.process_row(raw_data)
+        if row is None:
+            return None
+
+        values, specs = row
+        processed_data = dict(zip(self.columns, values))
+
         # Initialize dynamic Specification columns (e.g., spec_RAM, spec_Color)
         if all_spec_labels:
             for label in all_spec_labels:
                 processed_data[f"spec_{label}"] = None
-        
-        # Populate Specification values by matching keys
-        if raw_data.get("specs"):
-            for spec in raw_data["specs"]:
-                label = spec["specification"]["label"]
-                value = spec["valueText"][0] if spec["valueText"] else None
-                processed_data[f"spec_{label}"] = value
-        
+
+        for label, value in specs.items():
+            processed_data[f"spec_{label}"] = value
         return processed_data
-    
+
     def collect_all_specs(self, announcements_data):
         """
         Scans a batch of announcements to identify every unique specification label present.
         This is necessary for building consistent CSV headers.
         """
         all_specs = set()
-        
         for raw_data in announcements_data:
-            if raw_data and raw_data.get("specs"):
-                for spec in raw_data["specs"]:
-                    label = spec["specification"]["label"]
-                    all_specs.add(label)
-        
+            if raw_data:
+                all_specs.update(extract_specs(raw_data))
         return all_specs
 
-class CSVManagerALl:
+class CSVManagerBase:
     """
-    Manages CSV file lifecycle and writing for 'ALL' data mode.
+    Writes `(values, specs)` rows with csv.writer.
+    The CSV header is the mode's columns (minus EXCLUDED ones) followed by the spec columns.
     """
+    MODE = None
+    EXCLUDED = ()
+
     def __init__(self, filename, all_spec_labels=None):
         self.filename = filename
-        
-        # Canonical list of base fieldnames
-        base_fieldnames = [
-            "id", "reference", "title", "slug", "description", "creation_date", 
-            "status", "street_name", "created_at",
-            "price", "price_preview", "old_price", "old_price_preview", 
-            "price_type", "price_unit", "exchange_type",
-            "has_delivery", "delivery_type", "has_phone", "has_email", "quantity",
-            "category_id", "category_name", "category_slug",
-            "city", "city_id", "region", "region_id",
-            "user_id", "username", "user_display_name", "avatar_url",
-            "is_from_store", "store_id", "store_name", "store_slug", 
-            "store_description", "store_image_url", "store_follower_count", 
-            "store_announcements_count", "store_status",
-            "default_media_url", "default_media_type", "media_count",
-            "is_comment_enabled", "no_adsense", "external_url", "messenger_link", 
-            "show_analytics", "variants_count"
-        ]
-        
+        row_columns = mode_columns(self.MODE)
+        base_fieldnames = [column for column in row_columns if column not in self.EXCLUDED]
+
         # Append dynamic spec columns at the end
-        if all_spec_labels:
-            spec_fieldnames = [f"spec_{label}" for label in sorted(all_spec_labels)]
-            self.fieldnames = base_fieldnames + spec_fieldnames
+        self.spec_labels = ordered_spec_labels(all_spec_labels) if all_spec_labels else []
+        self.fieldnames = base_fieldnames + [f"spec_{label}" for label in self.spec_labels]
+
+        # Picks the exported values out of a row tuple
+        if base_fieldnames == row_columns:
+            self.pick = tuple
         else:
-            self.fieldnames = base_fieldnames
-            
+            self.pick = itemgetter(*(row_columns.index(column) for column in base_fieldnames))
+
         self.csvfile = None
         self.writer = None
-    
+
     def open(self):
         self.csvfile = open(self.filename, 'w', newline='', encoding='utf-8')
-        self.writer = csv.DictWriter(self.csvfile, fieldnames=self.fieldnames)
-        self.writer.writeheader()
-        print(f"CSV file initialized: {self.filename}")
-    
+        self.writer = csv.writer(self.csvfile)
+        self.writer.writerow(self.fieldnames)
+        log.debug("CSV file initialized: %s", self.filename)
+
     def write_rows(self, data_list):
         if not data_list or not self.writer:
             return 0
-        
-        written_count = 0
-        for data in data_list:
-            if data:
-                # Filter dictionary data to match fieldnames only
-                filtered_data = {k: v for k, v in data.items() if k in self.fieldnames}
-                self.writer.writerow(filtered_data)
-                written_count += 1
-        
+
+        pick = self.pick
+        spec_labels = self.spec_labels
+        rows = [(*pick(values), *map(specs.get, spec_labels)) for values, specs in filter(None, data_list)]
+        self.writer.writerows(rows)
+
         self.csvfile.flush()
-        return written_count
-    
+        return len(rows)
+
     def close(self):
         if self.csvfile:
             self.csvfile.close()
 
-class DataProcessorMini:
+class DataProcessorAll(DataProcessorBase):
+    """
+    Handles complex transformation of the 'ALL' data mode.
+    Extracts deep nested fields like city, store, and media URLs.
+    """
+    MODE = "ALL"
+
+class CSVManagerALl(CSVManagerBase):
+    """
+    Manages CSV file lifecycle and writing for 'ALL' data mode.
+    """
+    MODE = "ALL"
+
+class DataProcessorMini(DataProcessorBase):
     """
     Handles lightweight transformation of 'MINI' data mode.
     Focuses only on essential product info.
     """
-    def process_announcement(self, raw_data, all_spec_labels=None):
-        if not raw_data:
-            return None
+    MODE = "MINI"
+
+class CSVManagerMini(CSVManagerBase):
+    """
+    Manages CSV file lifecycle and writing for 'MINI' data mode.
+    """
+    MODE = "MINI"
+    EXCLUDED = ("id",)
+
+
+class DataProcessorSummary(DataProcessorBase):
+    """
+    Handles the 'SUMMARY' data mode.
+    Rows are built from search results directly; specs are only present
+    for listings that also went through a detail call.
+    """
+    MODE = "SUMMARY"
+
+class CSVManagerSummary(CSVManagerBase):
+    """
+    Manages CSV file lifecycle and writing for 'SUMMARY' data mode.
+    """
+    MODE = "SUMMARY"
+
+class SQLiteManager:
+    """
+    SQLite output backend, usable wherever a CSVManager is expected.
+    Rows are upserted by announcement `id` into one `announcements` table, so repeated
+    and incremental runs keep a single current view instead of piling up CSV files.
+    Dynamic spec_* values go to the `announcement_specs` key/value side table.
+    """
+    # Columns worth an index, whenever the current mode exports them
+    INDEXED_COLUMNS = ["price", "price_preview", "city", "category_slug", "category_id", "creation_date", "created_at"]
+    
+    def __init__(self, filename, all_spec_labels=None, base_manager=CSVManagerALl):
+        self.filename = filename
+        # Reuse the row layout of the matching CSV manager's extraction mode (id always comes first)
+        self.columns = mode_columns(base_manager.MODE)
+        self.conn = None
+    
+    def open(self):
+        # Shard processes may write the same database: wait for the writer lock instead of failing
+        self.conn = sqlite3.connect(self.filename, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
         
-        processed_data = {
-            "reference": raw_data.get("reference"),
-            "title": raw_data.get("title"),
-            "description": raw_data.get("description"),
-            "price_preview": raw_data.get("pricePreview"),
-            "created_at": raw_data.get("createdAt"),
-            "price_unit": raw_data.get("priceUnit"),
-            "city": None
-        }
+        # One write transaction for the whole migration: a shard reading table_info while
+        # another adds the same column would otherwise fail with "duplicate column name"
+        self.conn.execute("BEGIN IMMEDIATE")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS announcements (id TEXT PRIMARY KEY)")
+        existing = {row[1] for row in self.conn.execute("PRAGMA table_info(announcements)")}
+        for column in self.columns:
+            if column not in existing:
+                self.conn.execute(f'ALTER TABLE announcements ADD COLUMN "{column}"')
         
-        if raw_data.get("cities") and len(raw_data["cities"]) > 0:
-            processed_data["city"] = raw_data["cities"][0].get("name")
+        for column in self.INDEXED_COLUMNS:
+            if column in self.columns:
+                self.conn.execute(f'CREATE INDEX IF NOT EXISTS idx_announcements_{column} ON announcements ("{column}")')
         
-        if all_spec_labels:
-            for label in all_spec_labels:
-                processed_data[f"spec_{label}"] = None
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS announcement_specs (
+                announcement_id TEXT NOT NULL,
+                label TEXT NOT NULL,
+                value TEXT,
+                PRIMARY KEY (announcement_id, label)
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_specs_label_value ON announcement_specs (label, value)")
+        self.conn.commit()
         
-        if raw_data.get("specs"):
-            for spec in raw_data["specs"]:
-                label = spec["specification"]["label"]
-                value = spec["valueText"][0] if spec["valueText"] else None
-                processed_data[f"spec_{label}"] = value
+        quoted = ", ".join(f'"{column}"' for column in self.columns)
+        placeholders = ", ".join("?" for _ in self.columns)
+        updates = ", ".join(f'"{column}" = excluded."{column}"' for column in self.columns if column != "id")
+        self.upsert_sql = (f"INSERT INTO announcements ({quoted}) VALUES ({placeholders}) "
+                           f"ON CONFLICT(id) DO UPDATE SET {updates}")
+        log.info("SQLite database ready: %s", self.filename)
+    
+    def write_rows(self, data_list):
+        if not data_list or not self.conn:
+            return 0
         
-        return processed_data
+        rows = []
+        spec_rows = []
+        for values, specs in filter(None, data_list):
+            if values[0] is None:
+                continue
+            ann_id = str(values[0])
+            rows.append((ann_id, *values[1:]))
+            for label, value in specs.items():
+                if value is not None:
+                    spec_rows.append((ann_id, label, value))
+        
+        # One transaction per batch: upsert rows and replace their specs
+        with self.conn:
+            self.conn.executemany(self.upsert_sql, rows)
+            self.conn.executemany("DELETE FROM announcement_specs WHERE announcement_id = ?", [(row[0],) for row in rows])
+            self.conn.executemany("INSERT OR REPLACE INTO announcement_specs VALUES (?, ?, ?)", spec_rows)
+        
+        return len(rows)
     
-    def collect_all_specs(self, announcements_data):
-        all_specs = set()
-        for raw_data in announcements_data:
-            if raw_data and raw_data.get("specs"):
-                for spec in raw_data["specs"]:
-                    label = spec["specification"]["label"]
-                    all_specs.add(label)
-        return all_specs
+    def close(self):
+        if self.conn:
+            self.conn.close()
+            self.conn = None
 
-class CSVManagerMini:
+class RowSpool:
     """
-    Manages CSV file lifecycle and writing for 'MINI' data mode.
+    Temporary on-disk row store for streaming exports.
+    Processed rows are spooled to a JSON-lines file as they arrive, so memory stays flat
+    regardless of run size. Spec labels are tracked along the way and the final CSV
+    (with its complete header) is written in a single pass at the end.
     """
-    def __init__(self, filename, all_spec_labels=None):
-        self.filename = filename
-        base_fieldnames = ["reference", "title", "description", "price_preview", "created_at", "city", "price_unit"]
+    def __init__(self, csv_manager_class, chunk_size=500):
+        self.csv_manager_class = csv_manager_class
+        self.chunk_size = chunk_size
+        self.spec_labels = set()
+        self.count = 0
         
-        if all_spec_labels:
-            spec_fieldnames = [f"spec_{label}" for label in sorted(all_spec_labels)]
-            self.fieldnames = base_fieldnames + spec_fieldnames
-        else:
-            self.fieldnames = base_fieldnames
-            
-        self.csvfile = None
-        self.writer = None
+        fd, self.path = tempfile.mkstemp(prefix="ouedkniss_rows_", suffix=".jsonl")
+        self.spoolfile = os.fdopen(fd, 'w', encoding='utf-8')
     
-    def open(self):
-        self.csvfile = open(self.filename, 'w', newline='', encoding='utf-8')
-        self.writer = csv.DictWriter(self.csvfile, fieldnames=self.fieldnames)
-        self.writer.writeheader()
+    def add(self, row, specs=None):
+        if not row:
+            return
+        
+        # Remember late-appearing spec columns for the final header
+        self.spec_labels.update(row[1])
+        
+        self.spoolfile.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self.count += 1
     
-    def write_rows(self, data_list):
-        if not data_list or not self.writer:
-            return 0
+    def rows(self):
+        self.spoolfile.flush()
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+    
+    def export(self, filename):
+        """
+        Writes every spooled row to `filename` using the complete set of spec columns.
+        
+        Returns:
+            int: Number of rows written.
+        """
+        csv_manager = self.csv_manager_class(filename, self.spec_labels)
+        csv_manager.open()
+        
         written_count = 0
-        for data in data_list:
-            if data:
-                filtered_data = {k: v for k, v in data.items() if k in self.fieldnames}
-                self.writer.writerow(filtered_data)
-                written_count += 1
-        self.csvfile.flush()
+        chunk = []
+        for row in self.rows():
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                written_count += csv_manager.write_rows(chunk)
+                chunk = []
+        written_count += csv_manager.write_rows(chunk)
+        
+        csv_manager.close()
         return written_count
     
     def close(self):
-        if self.csvfile:
-            self.csvfile.close()
+        self.spoolfile.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class SpecRegistry:
+    """
+    Persistent, per-category list of spec columns.
+    Each spec label keeps the position it was first registered at, and new labels are
+    appended, so CSVs from different runs share a stable column order.
+    """
+    def __init__(self, category_slug, filename):
+        self.category_slug = category_slug
+        self.filename = filename
+        self.entries = []
+        
+        if os.path.exists(filename):
+            with open(filename, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f).get(category_slug, [])
+        self.labels = [entry["label"] for entry in self.entries]
+        self._known = set(self.labels)
+    
+    def observe(self, row, specs=None):
+        """
+        Registers spec labels of a processed row that are not known yet.
+        New labels are saved to the shared file right away, so shards of the same category
+        agree on their positions; labels other processes registered meanwhile come before them.
+        
+        Args:
+            row (tuple): A processed `(values, specs)` row.
+            specs (list, optional): The raw `specs` list, used to record codenames.
+            
+        Returns:
+            list: Labels that were added by this call.
+        """
+        added = []
+        for label in row[1]:
+            if label not in self._known:
+                self._known.add(label)
+                self.labels.append(label)
+                self.entries.append({"label": label, "codename": None})
+                added.append(label)
+        
+        if added and specs:
+            codenames = {spec["specification"]["label"]: spec["specification"].get("codename") for spec in specs}
+            for entry in self.entries[-len(added):]:
+                entry["codename"] = codenames.get(entry["label"])
+        if added:
+            self.save()
+        return added
+    
+    def save(self):
+        """
+        Merges this registry into the file, which is shared by every category and shard:
+        labels another process registered meanwhile keep their place, ours are appended.
+        """
+        with FileLock(f"{self.filename}.lock"):
+            registry = {}
+            if os.path.exists(self.filename):
+                with open(self.filename, 'r', encoding='utf-8') as f:
+                    registry = json.load(f)
+            
+            entries = registry.get(self.category_slug, [])
+            stored = {entry["label"] for entry in entries}
+            entries += [entry for entry in self.entries if entry["label"] not in stored]
+            registry[self.category_slug] = self.entries = entries
+            self.labels = [entry["label"] for entry in entries]
+            self._known = set(self.labels)
+            
+            temp_name = f"{self.filename}.tmp"
+            with open(temp_name, 'w', encoding='utf-8') as f:
+                json.dump(registry, f, indent=2, ensure_ascii=False)
+            os.replace(temp_name, self.filename)
+
+class RegistryExport:
+    """
+    One-pass CSV export driven by a SpecRegistry.
+    Rows are written as they arrive with the registry's column order. When a row brings
+    a label the category has never had, it is appended to the registry and the header is
+    widened in place, which only happens when the category's schema actually grows.
+    The header always follows the shared registry file, so concurrent shards of a category
+    write the same column order. Same interface as RowSpool.
+    """
+    def __init__(self, csv_manager_class, filename, registry, chunk_size=500):
+        self.csv_manager_class = csv_manager_class
+        self.filename = filename
+        self.registry = registry
+        self.chunk_size = chunk_size
+        self.pending = []
+        self.count = 0
+        self.written_count = 0
+        self.finished = False
+        
+        self.csv_manager = csv_manager_class(filename, list(registry.labels))
+        self.csv_manager.open()
+    
+    def add(self, row, specs=None):
+        if not row:
+            return
+        
+        if self.registry.observe(row, specs):
+            self._widen()
+        
+        self.pending.append(row)
+        self.count += 1
+        if len(self.pending) >= self.chunk_size:
+            self._flush()
+    
+    def _flush(self):
+        self.written_count += self.csv_manager.write_rows(self.pending)
+        self.pending = []
+    
+    def _widen(self):
+        """
+        Rewrites the rows written so far under a header that includes the new labels.
+        """
+        self._flush()
+        self.csv_manager.close()
+        previous_width = len(self.csv_manager.fieldnames)
+        
+        old_name = f"{self.filename}.old"
+        os.replace(self.filename, old_name)
+        self.csv_manager = self.csv_manager_class(self.filename, list(self.registry.labels))
+        self.csv_manager.open()
+        
+        # New spec columns are always appended, so old rows only need padding
+        padding = [""] * (len(self.csv_manager.fieldnames) - previous_width)
+        with open(old_name, 'r', newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            self.csv_manager.writer.writerows(row + padding for row in reader)
+        os.remove(old_name)
+    
+    def export(self, filename=None):
+        """
+        Flushes the remaining rows and persists the registry.
+        
+        Returns:
+            int: Number of rows written.
+        """
+        self._flush()
+        # Take the labels other shards registered since the last widening, so every file ends with the same header
+        self.registry.save()
+        if len(self.registry.labels) > len(self.csv_manager.spec_labels):
+            self._widen()
+        self.csv_manager.close()
+        self.finished = True
+        return self.written_count
+    
+    def close(self):
+        """
+        Closes the file; an export that never finished is removed, like a RowSpool's temp file.
+        """
+        self.csv_manager.close()
+        if not self.finished and os.path.exists(self.filename):
+            os.remove(self.filename)
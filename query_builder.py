@@ -0,0 +1,141 @@
+from settings import ENTITY_CACHE, ENTITY_CACHE_SLIM
+from process import FIELDS, mode_columns, entity_tables
+
+"""
+Detail Query Builder.
+Generates the announcementDetails field selection from the columns a run exports,
+using the same FIELDS mapping as the processor, so every request downloads only
+what ends up in the output instead of a fixed catch-all query.
+"""
+
+# Response keys the query has to spell differently: aliases and field arguments
+FIELD_SELECTIONS = {
+    "createdAt": "createdAt: refreshedAt",
+    "defaultMedia": "defaultMedia(size: ORIGINAL)",
+    "medias": "medias(size: LARGE)",
+}
+
+# Read outside of the column mapping: spec_* columns and registry codenames,
+# and the refreshedAt version that keys the raw response cache
+REQUIRED_PATHS = [
+    "specs.specification.label",
+    "specs.specification.codename",
+    "specs.valueText",
+    "createdAt",
+]
+
+# Image URLs for the media download stage (MINI mode downloads no images)
+MEDIA_PATHS = ["medias.mediaUrl"]
+
+
+def column_paths(columns, fields=FIELDS):
+    """
+    Lists the response paths the given columns are extracted from.
+
+    Args:
+        columns (list): Output column names, all declared in `fields`.
+        fields (dict): Column name -> dotted path or Count-like source.
+
+    Returns:
+        list: Dotted paths, e.g. ["title", "cities.0.name", "medias.mediaUrl"].
+    """
+    paths = []
+    for column in columns:
+        source = fields[column]
+        paths.append(source.selection if callable(source) else source)
+    return paths
+
+
+def normalize_paths(paths):
+    """
+    Sorted, de-duplicated paths without list indexes ("cities.0.name" -> "cities.name"):
+    the form raw cache entries record the fields they hold in.
+    """
+    return sorted({".".join(step for step in path.split(".") if not step.isdigit()) for path in paths})
+
+
+def build_selection(paths, indent=16):
+    """
+    Renders dotted paths as a GraphQL selection set (list indexes are dropped,
+    aliases and arguments come from FIELD_SELECTIONS). Fields are sorted, so the
+    same set of columns gives the same query text and cache hash in any order.
+    """
+    tree = {}
+    for path in paths:
+        node = tree
+        for step in path.split("."):
+            if not step.isdigit():
+                node = node.setdefault(step, {})
+
+    def render(node, depth, prefix):
+        pad = " " * (indent + 4 * depth)
+        for key, children in sorted(node.items()):
+            selection = FIELD_SELECTIONS.get(prefix + key, key)
+            if children:
+                yield f"{pad}{selection} {{"
+                yield from render(children, depth + 1, f"{prefix}{key}.")
+                yield f"{pad}}}"
+            else:
+                yield f"{pad}{selection}"
+
+    return "\n" + "\n".join(render(tree, 0, "")) + "\n"
+
+
+def export_paths(mode, columns=None, entities=ENTITY_CACHE):
+    """
+    Lists the response paths a row of an extraction mode is built from.
+
+    Args:
+        mode (str): "ALL", "MINI" or "SUMMARY".
+        columns (list, optional): Exported columns, mode_columns(mode) by default.
+        entities (bool): Rows carry store_id / user_id instead of the entity columns (ENTITY_CACHE).
+
+    Returns:
+        list: Normalized paths (see normalize_paths).
+    """
+    # SUMMARY rows normally come from the search results, but a listing without one
+    # (e.g. recovered from a drifted page boundary) is exported from its details alone
+    if columns is None:
+        columns = mode_columns(mode, entities=entities)
+    return normalize_paths(column_paths(columns) + REQUIRED_PATHS)
+
+
+def detail_paths(mode, columns=None, entities=ENTITY_CACHE):
+    """
+    Lists the response paths the detail query of an extraction mode selects:
+    the exported ones, the full subtree of entities not in ENTITY_CACHE_SLIM (cached
+    from the response itself), plus image URLs for the media stage.
+    """
+    paths = export_paths(mode, columns, entities)
+    if entities:
+        tables = entity_tables(mode) if columns is None else entity_tables(mode, columns)
+        for entity, table in tables.items():
+            if entity not in ENTITY_CACHE_SLIM:
+                paths = normalize_paths(paths + column_paths(table))
+    if mode != "MINI":
+        paths = normalize_paths(paths + MEDIA_PATHS)
+    return paths
+
+
+def detail_fields(mode, columns=None):
+    """
+    Builds the detail query selection of an extraction mode.
+
+    Args:
+        mode (str): "ALL", "MINI" or "SUMMARY".
+        columns (list, optional): Exported columns, mode_columns(mode) by default.
+
+    Returns:
+        str: The selection, for get_payload_post / get_payload_post_batch.
+    """
+    return build_selection(detail_paths(mode, columns))
+
+
+def entity_fields(tables):
+    """
+    Builds the selection that backfills cached entities, e.g. `store { id name ... }`.
+
+    Args:
+        tables (dict): {entity: columns}, as returned by process.entity_tables.
+    """
+    return build_selection(column_paths([column for columns in tables.values() for column in columns]))
@@ -0,0 +1,311 @@
+import threading
+import time
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from metrics import metrics
+from log import get_logger
+
+"""
+Shared Rate Limiting.
+A single limiter instance is handed to every component that talks to the API,
+so concurrent workers draw from one common request budget.
+"""
+
+log = get_logger("rate_limit")
+
+
+class RateLimiter:
+    """
+    Thread-safe limiter that spaces out requests to a maximum rate.
+    Each caller reserves the next free time slot, then sleeps until it arrives.
+    """
+    def __init__(self, requests_per_second):
+        self.min_interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = time.monotonic()
+
+    def acquire(self):
+        """
+        Blocks until the caller is allowed to send its next request.
+        """
+        # Even without a rate (min_interval 0) a pause from Retry-After is honored
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.min_interval
+
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+    def pause(self, seconds):
+        """
+        Holds back every caller for `seconds` (e.g. a Retry-After), without double-counting
+        a pause that is already in effect. The caller holds the lock.
+        """
+        self._next_slot = max(self._next_slot, time.monotonic() + seconds)
+
+    def record(self, status, latency=None, retry_after=None):
+        """
+        Feeds one response (status None for a connection error) back into the limiter.
+        A fixed-rate limiter only honors Retry-After.
+        """
+        if retry_after:
+            with self._lock:
+                self.pause(retry_after)
+
+
+class HostRateLimiter:
+    """
+    Keeps an independent RateLimiter per host, so e.g. the image CDN
+    has its own budget separate from the GraphQL API.
+    """
+    def __init__(self, requests_per_second):
+        self.requests_per_second = requests_per_second
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            limiter = self._limiters.get(host)
+            if limiter is None:
+                limiter = self._limiters[host] = RateLimiter(self.requests_per_second)
+        limiter.acquire()
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    """
+    RateLimiter whose rate follows the health of the responses (AIMD):
+    it creeps up while responses are fast and successful, is cut multiplicatively on
+    429/5xx or when latency climbs well above the best seen, and pauses every caller
+    for the duration of a Retry-After.
+    """
+    def __init__(self, requests_per_second, min_rate, max_rate, increase_step, increase_window,
+                 backoff_factor, latency_ratio, cooldown=1.0):
+        super().__init__(requests_per_second)
+        self.rate = requests_per_second or max_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase_step = increase_step
+        self.increase_window = increase_window
+        self.backoff_factor = backoff_factor
+        self.latency_ratio = latency_ratio
+        # At most one decrease per cooldown, so a burst of failures counts as one congestion signal
+        self.cooldown = cooldown
+
+        self._healthy = 0
+        self._last_decrease = 0.0
+        self._latency = None
+        self._best_latency = None
+        self._set_rate(self.rate)
+
+    def _set_rate(self, rate):
+        self.rate = min(max(rate, self.min_rate), self.max_rate)
+        self.min_interval = 1.0 / self.rate
+        metrics.set("api_rate_limit", round(self.rate, 3))
+
+    def _decrease(self, factor, reason):
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self._healthy = 0
+        self._set_rate(self.rate * factor)
+        metrics.inc("rate_backoffs_total", reason=reason)
+        log.info("Backing off to %.2f requests/s (%s).", self.rate, reason)
+
+    def record(self, status, latency=None, retry_after=None):
+        with self._lock:
+            if retry_after:
+                self.pause(retry_after)
+
+            if status is None or status == 429 or status >= 500:
+                self._decrease(self.backoff_factor, "throttled" if status == 429 else "error")
+                return
+
+            if latency is not None:
+                # Exponentially weighted latency, compared with the best level seen this run
+                self._latency = latency if self._latency is None else 0.8 * self._latency + 0.2 * latency
+                if self._best_latency is None or self._latency < self._best_latency:
+                    self._best_latency = self._latency
+                if self._latency > self._best_latency * self.latency_ratio:
+                    self._decrease((1 + self.backoff_factor) / 2, "latency")
+                    return
+
+            self._healthy += 1
+            if self._healthy >= self.increase_window and self.rate < self.max_rate:
+                self._healthy = 0
+                self._set_rate(self.rate + self.increase_step)
+
+
+class FairShareLimiter:
+    """
+    Splits the budget of one limiter between several consumers (e.g. categories) by weight.
+    While several consumers are waiting, the next slot goes to the one that has used the
+    least of its weighted share so far. A consumer coming back from idle starts level with
+    the others instead of cashing in the slots it did not use.
+    """
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self._cond = threading.Condition()
+        self._weights = {}
+        self._usage = {}
+        self._waiting = {}
+        self._busy = False
+
+    def share(self, name, weight=1):
+        """
+        Returns:
+            LimiterShare: A limiter view for one consumer, usable wherever a RateLimiter is expected.
+        """
+        with self._cond:
+            self._weights[name] = max(weight, 1e-6)
+            self._usage.setdefault(name, 0.0)
+            self._waiting.setdefault(name, 0)
+        return LimiterShare(self, name)
+
+    def _next(self):
+        return min((name for name, count in self._waiting.items() if count), key=self._usage.get)
+
+    def acquire(self, name):
+        with self._cond:
+            if not self._waiting[name]:
+                others = [self._usage[other] for other, count in self._waiting.items() if count]
+                if others:
+                    self._usage[name] = max(self._usage[name], min(others))
+            self._waiting[name] += 1
+            while self._busy or self._next() != name:
+                self._cond.wait()
+            # One consumer at a time reserves a slot, so slots are handed out in fair order
+            self._busy = True
+            self._waiting[name] -= 1
+
+        try:
+            self.limiter.acquire()
+        finally:
+            with self._cond:
+                self._busy = False
+                self._usage[name] += 1.0 / self._weights[name]
+                self._cond.notify_all()
+
+
+class LimiterShare:
+    """
+    One consumer's view of a FairShareLimiter. Responses are fed to the shared limiter,
+    so a 429 seen by one category slows every category down.
+    """
+    def __init__(self, fair_share, name):
+        self.fair_share = fair_share
+        self.name = name
+
+    def acquire(self):
+        self.fair_share.acquire(self.name)
+
+    def record(self, status, latency=None, retry_after=None):
+        self.fair_share.limiter.record(status, latency, retry_after)
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised when the API stayed unavailable for longer than the breaker is allowed to wait.
+    """
+
+
+class CircuitBreaker:
+    """
+    Pauses every caller while the API is down instead of burning through the ID list.
+
+    After `failure_threshold` consecutive failures the circuit opens: callers wait for
+    `cooldown` seconds, then a single probe request is let through. A successful probe
+    closes the circuit; a failed one reopens it with a doubled cooldown. Once the outage has
+    lasted more than `max_wait` seconds (wall-clock, since the circuit first opened),
+    CircuitOpenError is raised.
+    """
+    def __init__(self, failure_threshold, cooldown, max_wait):
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_wait = max_wait
+
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        # Start of the current outage; reopening after a failed probe keeps it
+        self._first_opened_at = None
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+    def before_request(self):
+        """
+        Blocks while the circuit is open. Returns once this caller may send a request.
+        """
+        while True:
+            with self._lock:
+                if self._opened_at is None:
+                    return
+                remaining = self._opened_at + self.cooldown - time.monotonic()
+                if remaining <= 0 and not self._probing:
+                    # Half-open: this caller is the probe
+                    self._probing = True
+                    return
+                if time.monotonic() - self._first_opened_at >= self.max_wait:
+                    raise CircuitOpenError(f"API unavailable for more than {self.max_wait}s")
+
+            time.sleep(max(min(remaining, 1.0), 0.1))
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                log.warning("API reachable again, resuming the run.")
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+            self.cooldown = self.base_cooldown
+            self._first_opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing:
+                # Failed probe: stay open for longer
+                self._probing = False
+                self._opened_at = time.monotonic()
+                self.cooldown = min(self.cooldown * 2, self.max_wait)
+                log.warning("API still failing, pausing for %.0fs.", self.cooldown)
+            elif self._opened_at is None and self._failures >= self.failure_threshold:
+                self._opened_at = self._first_opened_at = time.monotonic()
+                metrics.inc("breaker_opens_total")
+                log.warning("%d consecutive API failures, pausing the run for %.0fs.", self._failures, self.cooldown)
+
+
+def backoff_delay(attempt, base, cap, retry_after=None):
+    """
+    Delay before retry number `attempt` (0-based): the server's Retry-After when given,
+    otherwise exponential backoff with full jitter, capped at `cap` seconds.
+    """
+    if retry_after is not None:
+        return min(retry_after, cap)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def parse_retry_after(value):
+    """
+    Parses a Retry-After header (seconds or HTTP date) into seconds, or None.
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
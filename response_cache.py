@@ -0,0 +1,136 @@
+import time
+import zlib
+import sqlite3
+import threading
+from settings import RAW_CACHE_FILE, RAW_CACHE_MAX_MB
+from json_backend import dumps_bytes, loads
+from log import get_logger
+
+"""
+Raw Response Cache.
+Keeps every announcementDetails response, zlib-compressed, keyed by
+(announcement ID, detail query hash, refreshedAt). CSVs can then be rebuilt
+offline after a mapping change in process.py without calling the API again.
+Each query hash is registered with the fields it selects, so a re-export with
+fewer or reordered columns still finds the responses that hold them.
+"""
+
+log = get_logger("response_cache")
+
+
+class RawResponseCache:
+    """
+    SQLite-backed cache of compressed raw responses with size-based eviction.
+    Oldest entries are evicted first once the stored bytes exceed `max_mb`.
+    One instance can be shared by the threads of concurrently scraped categories.
+    """
+    def __init__(self, filename=RAW_CACHE_FILE, max_mb=RAW_CACHE_MAX_MB):
+        self.max_bytes = max_mb * 1024 * 1024 if max_mb else None
+        self.conn = sqlite3.connect(filename, timeout=30, check_same_thread=False)
+        self._lock = threading.RLock()
+        # WAL keeps per-response commits cheap
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                ann_id TEXT NOT NULL,
+                query_hash TEXT NOT NULL,
+                refreshed_at TEXT NOT NULL,
+                category_slug TEXT,
+                stored_at REAL NOT NULL,
+                size INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                PRIMARY KEY (ann_id, query_hash, refreshed_at)
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_stored_at ON responses (stored_at)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_category ON responses (category_slug, query_hash)")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS queries (
+                query_hash TEXT PRIMARY KEY,
+                paths TEXT NOT NULL
+            )
+        """)
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def register_query(self, query_hash, paths):
+        """
+        Records the response paths a detail query selects (see query_builder.detail_paths).
+        """
+        with self._lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO queries VALUES (?, ?)", (query_hash, dumps_bytes(paths).decode('utf-8')))
+
+    def covering_queries(self, paths):
+        """
+        Returns:
+            list: Hashes of the registered queries that select every path of `paths`.
+        """
+        needed = set(paths)
+        rows = self.conn.execute("SELECT query_hash, paths FROM queries").fetchall()
+        return [query_hash for query_hash, selected in rows if needed <= set(loads(selected))]
+
+    def put(self, ann_id, query_hash, raw_data, category_slug=None):
+        """
+        Stores one raw response. The same (ID, query, refreshedAt) key is only kept once.
+        """
+        data = zlib.compress(dumps_bytes(raw_data))
+        refreshed_at = raw_data.get("createdAt") or ""
+        key = (str(ann_id), query_hash, refreshed_at)
+
+        with self._lock:
+            previous = self.conn.execute(
+                "SELECT size FROM responses WHERE ann_id = ? AND query_hash = ? AND refreshed_at = ?", key
+            ).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (*key, category_slug, time.time(), len(data), data)
+            )
+            self.conn.commit()
+
+            self.total_bytes += len(data) - (previous[0] if previous else 0)
+            if self.max_bytes and self.total_bytes > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        """
+        Deletes the oldest entries until the cache is back under 90% of its size limit.
+        """
+        target = self.max_bytes * 0.9
+        with self._lock:
+            rows = self.conn.execute("SELECT rowid, size FROM responses ORDER BY stored_at")
+            doomed = []
+            for rowid, size in rows:
+                if self.total_bytes <= target:
+                    break
+                doomed.append((rowid,))
+                self.total_bytes -= size
+
+            self.conn.executemany("DELETE FROM responses WHERE rowid = ?", doomed)
+            self.conn.commit()
+        log.info("Raw cache: evicted %d old responses.", len(doomed))
+
+    def iter_latest(self, category_slug, query_hashes):
+        """
+        Yields the most recent cached response of every announcement in a category,
+        among the responses of any of `query_hashes`.
+        Rows are decompressed one at a time, so memory stays flat.
+        """
+        query_hashes = list(query_hashes)
+        placeholders = ", ".join("?" for _ in query_hashes)
+        rows = self.conn.execute(f"""
+            SELECT ann_id, data FROM responses
+            WHERE category_slug = ? AND query_hash IN ({placeholders})
+            ORDER BY ann_id, refreshed_at DESC, stored_at DESC
+        """, (category_slug, *query_hashes))
+        previous_id = None
+        for ann_id, data in rows:
+            if ann_id != previous_id:
+                previous_id = ann_id
+                yield loads(zlib.decompress(data))
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
@@ -1,23 +1,221 @@
+import os
 from datetime import datetime
+from functools import partial
 import time
-from fetch_api import OuedKnissAPI
+from concurrent.futures import ThreadPoolExecutor
+from fetch_api import OuedKnissAPI, ANNOUNCEMENT_FIELDS, ANNOUNCEMENT_PATHS, create_rate_limiter
 from settings import *
-from downloader import download_announcement_images
-from utils import load_scraped_ids, save_scraped_id
+from downloader import MediaDownloadPool
+from utils import load_watermarks, save_watermark, get_query_hash
+from id_store import ScrapedIDStore
+from http_session import HTTPSession
+from rate_limit import CircuitBreaker, HostRateLimiter, FairShareLimiter
+from sharding import Shard
+from journal import SessionJournal, list_open_sessions
+from response_cache import RawResponseCache
+from entity_cache import EntityCache, EntityResolver
+from query_builder import entity_fields, export_paths
+from metrics import metrics
+from log import get_logger, fields, bind
 
 """
 Core Scraper Engine.
 Coordinates API fetching, data processing, persistence, and image downloading.
 """
 
+log = get_logger("scraper")
+
 # Dynamic component loading based on extraction depth (see settings.py)
 if TYPE=="MINI":
     from process import CSVManagerMini as CSVManager, DataProcessorMini as DataProcessor
 elif TYPE=="ALL":
     from process import CSVManagerALl as CSVManager, DataProcessorAll as DataProcessor
+elif TYPE=="SUMMARY":
+    from process import CSVManagerSummary as CSVManager, DataProcessorSummary as DataProcessor
+from process import RowSpool, SQLiteManager, SpecRegistry, RegistryExport, entity_tables
+
+# Output backend (see settings.py): the SQLite sink reuses the CSV column list of the current mode
+if OUTPUT == "SQLITE":
+    OutputManager = partial(SQLiteManager, base_manager=CSVManager)
+else:
+    OutputManager = CSVManager
+
+# Store / user tables written next to the rows, and the query backfilling them (see ENTITY_CACHE)
+ENTITY_TABLES = entity_tables(TYPE) if ENTITY_CACHE else {}
+ENTITY_FIELDS = entity_fields(ENTITY_TABLES)
+
+
+class SharedResources:
+    """
+    Everything a process loads once and reuses for every category it scrapes:
+    the pooled HTTP session, the API rate limiter and circuit breaker, the CDN
+    rate limiter, the tracking store, the raw response cache and the entity cache.
+    
+    Args:
+        rate_share (float): Fraction of the API and CDN budgets this process may use
+                            (1 / count for the processes of sharding.launch_shards).
+    """
+    def __init__(self, rate_share=1):
+        self.session = HTTPSession()
+        self.rate_limiter = create_rate_limiter(rate_share)
+        self.breaker = CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_COOLDOWN, BREAKER_MAX_WAIT)
+        self.media_limiter = HostRateLimiter(MEDIA_REQUESTS_PER_SECOND * rate_share if MEDIA_REQUESTS_PER_SECOND else None)
+        self.scraped_ids = ScrapedIDStore()
+        log.info("Loaded %d already scraped IDs from %s.", len(self.scraped_ids), TRACKING_STORE)
+        self.cache = RawResponseCache() if RAW_CACHE else None
+        self.entities = EntityCache() if ENTITY_TABLES else None
+    
+    def close(self):
+        self.scraped_ids.close()
+        if self.cache is not None:
+            self.cache.close()
+        if self.entities is not None:
+            self.entities.close()
+        log.info("Connection reuse per host:")
+        self.session.print_stats()
+        self.session.close()
+
+
+def fetch_details(api, target_ids):
+    """
+    Yields (ann_id, raw_data) pairs using the strategy selected by FETCH_MODE.
+    
+    Args:
+        api (OuedKnissAPI): The API client.
+        target_ids (list): Announcement IDs to fetch.
+    
+    Yields:
+        tuple: (ann_id, raw_data). raw_data is None when the fetch failed.
+    """
+    if FETCH_MODE == "CONCURRENT":
+        # Results arrive in completion order, not input order
+        yield from api.get_announcement_details_concurrent(target_ids, MAX_WORKERS, BATCH_SIZE)
+        return
+    
+    # Sequential fallback: one request at a time
+    for ann_id in target_ids:
+        yield ann_id, api.get_announcement_details(ann_id)
+        
+        # Internal rate limiting between detail requests
+        time.sleep(WAIT_TIME)
+
+
+def output_filename(category_slug, shard_suffix=""):
+    if OUTPUT == "SQLITE":
+        return SQLITE_FILE
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"ouedkniss_{category_slug.replace('-', '_')}{shard_suffix}_{timestamp}.csv"
+
+
+def serve_metrics(shard):
+    # Local shard processes each take their own port: METRICS_PORT + shard index
+    return metrics.serve(METRICS_PORT + shard.index) if METRICS_PORT else None
+
+
+def open_export(category_slug, filename):
+    """
+    Picks the row sink for a run: a one-pass registry-driven CSV export when the
+    spec registry is enabled, otherwise a spool exported once all specs are known.
+    """
+    if OUTPUT == "CSV" and SPEC_REGISTRY:
+        return RegistryExport(CSVManager, filename, SpecRegistry(category_slug, SPEC_REGISTRY_FILE))
+    return RowSpool(OutputManager)
+
+
+def select_target_ids(api, category_slug, max_pages, scraped_ids, shard=None, limit=LIMIT_PER_RUN, logger=log):
+    """
+    Scans the category and decides which announcements this session will fetch.
+    
+    Args:
+        api (OuedKnissAPI): The API client.
+        category_slug (str): The OuedKniss category identifier.
+        max_pages (int, optional): Limit on how many pages to scan.
+        scraped_ids (ScrapedIDStore): IDs already tracked as scraped.
+        shard (Shard, optional): The part of the ID space this process fetches (default: settings.py).
+        limit (int, optional): Max announcements for this session (None = all new ones).
+        logger (Logger, optional): Where progress is logged.
+    
+    Returns:
+        tuple: (target_ids, new_watermark or None, advance_watermark)
+    """
+    shard = shard or Shard()
+    logger.info("Fetching announcement IDs for category: %s...", category_slug)
+    new_watermark = None
+    failed_pages = []
+    if INCREMENTAL:
+        # Each shard advances its own watermark: the others may not have fetched their part yet
+        watermark = load_watermarks(WATERMARK_FILE).get(category_slug + shard.suffix)
+        announcement_ids, new_watermark, failed_pages = api.get_new_announcement_ids(
+            category_slug, watermark, max_pages, known_ids=scraped_ids, shard=shard
+        )
+    else:
+        announcement_ids = api.get_announcement_ids_from_pages(category_slug, max_pages)
+    logger.info("Found %d total announcement IDs in category.", len(announcement_ids))
+    
+    # Filter: Keep only IDs we haven't seen before
+    new_announcement_ids = [aid for aid in announcement_ids if str(aid) not in scraped_ids]
+    logger.info("Filtered: %d new announcements found.", len(new_announcement_ids))
+    
+    # Filter: Keep only the IDs of this process's shard (see SHARD_* in settings.py)
+    if shard.count > 1:
+        new_announcement_ids = [aid for aid in new_announcement_ids if aid in shard]
+        logger.info("Shard %s (%s): %d announcements remaining.", shard, shard.strategy, len(new_announcement_ids))
+    
+    # Apply per-run throughput limit (see LIMIT_PER_RUN in settings.py)
+    # If the limit is None, process ALL new announcements
+    if limit is not None:
+        target_ids = new_announcement_ids[:limit]
+    else:
+        target_ids = new_announcement_ids
+    logger.info("Processing %d announcements for this session (limit: %s).",
+                len(target_ids), 'None (ALL)' if limit is None else limit)
+    
+    # The watermark may only advance if this run covers every new announcement,
+    # otherwise IDs cut off by the limit (or on pages that failed) would fall behind it and never be seen again
+    advance_watermark = (new_watermark is not None and not failed_pages
+                         and len(target_ids) == len(new_announcement_ids))
+    if failed_pages:
+        logger.warning("Watermark kept in place: %d page(s) failed during the scan.", len(failed_pages))
+        request_rescan(category_slug + shard.suffix)
+    return target_ids, new_watermark, advance_watermark
 
 
-def scrape_ouedkniss(category_slug: str, max_pages:int = None) -> str:
+def request_rescan(watermark_key):
+    """
+    Keeps the stored watermark, and makes the next scan go past it instead of stopping
+    at the first known page: listings it missed may sit between known ones.
+    """
+    watermark = load_watermarks(WATERMARK_FILE).get(watermark_key)
+    save_watermark(WATERMARK_FILE, watermark_key, {**(watermark or {"refreshed_at": None, "ids": []}), "rescan": True})
+
+
+def write_run_metrics(session_id, category_slug, shard):
+    """
+    Writes the run's metrics summary (JSON) and Prometheus text file, as configured in settings.py.
+    """
+    try:
+        if METRICS_DIR:
+            metrics.write_json(os.path.join(METRICS_DIR, f"{session_id}.json"),
+                               session_id=session_id, category=category_slug, mode=TYPE, shard=str(shard))
+        if METRICS_PROM_FILE:
+            metrics.write_prometheus(shard.tag(METRICS_PROM_FILE))
+    except OSError as e:
+        log.warning("Could not write run metrics: %s", e)
+    
+    summary = metrics.summary()["counters"]
+    log.info("Run metrics", extra=fields(
+        pages=metrics.value("pages_scanned_total", result="ok"),
+        details=metrics.value("details_total", result="ok"),
+        detail_failures=metrics.value("details_total", result="failed"),
+        retries=sum(value for series, value in summary.items() if series.startswith("retries_total")),
+        media_bytes=metrics.value("media_bytes_total"),
+        rows=metrics.value("rows_written_total"),
+    ))
+
+
+def scrape_ouedkniss(category_slug: str, max_pages:int = None, session_id: str = None,
+                     shared: SharedResources = None, rate_limiter=None, limit=LIMIT_PER_RUN, shard: Shard = None,
+                     rate_share=1) -> str:
     """
     Main entry point for scraping OuedKniss categories.
     
@@ -25,98 +223,317 @@ def scrape_ouedkniss(category_slug: str, max_pages:int = None) -> str:
         category_slug (str): The OuedKniss category identifier.
         max_pages (int, optional): Limit on how many pages to scan. 
                                    None scans all available pages.
+        session_id (str, optional): Resume an interrupted session from its journal.
+                                    None starts a new session.
+        shared (SharedResources, optional): Resources shared with other categories of the
+                                            same process (see scrape_categories). None
+                                            loads them for this run alone.
+        rate_limiter (optional): This category's share of the request budget.
+                                 Defaults to the shared API limiter.
+        limit (int, optional): Max new announcements for this session (None = all).
+        shard (Shard, optional): The part of the ID space this process fetches.
+                                 None uses SHARD_INDEX/SHARD_COUNT from settings.py.
+        rate_share (float, optional): Fraction of the request budgets used when `shared`
+                                      is None (see SharedResources).
     
     Returns:
         str: The filename of the generated CSV, or None on failure.
     """
-    # Initialize API connector and Data Processor
-    api = OuedKnissAPI()
+    shard = shard or Shard()
+    owns_resources = shared is None
+    metrics_server = None
+    if owns_resources:
+        # Fresh counters for this run; optionally exposed live to a Prometheus scraper
+        metrics.reset()
+        metrics_server = serve_metrics(shard)
+        
+        # Step 1: Initialize Persistence (Skip duplicates) and the pooled session,
+        # which is shared by the API client and the image downloader
+        shared = SharedResources(rate_share)
+    
+    # Several categories or shards may log at once: tag every line with this one
+    tags = {} if owns_resources else {"category": category_slug}
+    if shard.count > 1:
+        tags["shard"] = str(shard)
+    log = bind(get_logger("scraper"), **tags) if tags else get_logger("scraper")
+    
+    session = shared.session
+    scraped_ids = shared.scraped_ids
+    cache = shared.cache
     processor = DataProcessor()
+    entities = EntityResolver(shared.entities, ENTITY_TABLES) if shared.entities is not None else None
+    
+    # SUMMARY mode: keep the search-result fields of new listings as pages come in
+    summaries = {}
+    def harvest(listings):
+        for listing in listings:
+            if str(listing["id"]) not in scraped_ids:
+                summaries[listing["id"]] = listing
     
-    # Step 1: Initialize Persistence (Skip duplicates)
-    scraped_ids = load_scraped_ids(TRACKING_FILE)
-    print(f"Loaded {len(scraped_ids)} already scraped IDs from {TRACKING_FILE}.")
+    api = OuedKnissAPI(rate_limiter=rate_limiter or shared.rate_limiter, session=session,
+                       on_search_page=harvest if TYPE == "SUMMARY" else None, breaker=shared.breaker)
+    journal = SessionJournal(session_id or SessionJournal.new_session_id(category_slug + shard.suffix))
+    query_hash = get_query_hash(ANNOUNCEMENT_FIELDS)
+    if cache is not None:
+        cache.register_query(query_hash, ANNOUNCEMENT_PATHS)
+    
+    # With a scheduler, journals of the other running categories are open too; it checks once up front
+    if owns_resources:
+        warn_open_sessions(journal.session_id, shard)
     
     try:
-        # Step 2: Fetch Announcement IDs
-        print(f"Fetching announcement IDs for category: {category_slug}...")
-        announcement_ids = api.get_announcement_ids_from_pages(category_slug, max_pages)
-        print(f"Found {len(announcement_ids)} total announcement IDs in category.")
-        
-        # Filter: Keep only IDs we haven't seen before
-        new_announcement_ids = [aid for aid in announcement_ids if str(aid) not in scraped_ids]
-        print(f"Filtered: {len(new_announcement_ids)} new announcements found.")
-        
-        # Filter: Keep only announcements with even IDs
-        new_announcement_ids = [aid for aid in new_announcement_ids if int(aid) % 2 == 1]
-        print(f"Even-ID filter applied: {len(new_announcement_ids)} announcements remaining.")
-        
-        # Apply per-run throughput limit (see settings.py)
-        # If LIMIT_PER_RUN is None, process ALL new announcements
-        if LIMIT_PER_RUN is not None:
-            target_ids = new_announcement_ids[:LIMIT_PER_RUN]
+        # Step 2: Fetch Announcement IDs (or take them from the journal when resuming)
+        if journal.exists():
+            header = journal.read_header()
+            if journal.is_committed() or not header:
+                log.warning("Session '%s' has nothing left to resume.", journal.session_id)
+                return None
+            
+            log.info("Resuming session '%s'...", journal.session_id)
+            target_ids = header["target_ids"]
+            summaries = header.get("summaries", {})
+            new_watermark = header.get("watermark")
+            advance_watermark = header.get("advance_watermark", False)
         else:
-            target_ids = new_announcement_ids
-        print(f"Processing {len(target_ids)} announcements for this session (limit: {'None (ALL)' if LIMIT_PER_RUN is None else LIMIT_PER_RUN}).")
-        
-        if not target_ids:
-            print("No new announcements to process. Exiting.")
-            return None
+            with metrics.stage("scan"):
+                target_ids, new_watermark, advance_watermark = select_target_ids(api, category_slug, max_pages, scraped_ids, shard, limit, log)
+            
+            if not target_ids:
+                if advance_watermark:
+                    save_watermark(WATERMARK_FILE, category_slug + shard.suffix, new_watermark)
+                log.info("No new announcements to process. Exiting.")
+                return None
+            
+            summaries = {aid: summaries[aid] for aid in target_ids if aid in summaries}
+            journal.start(category_slug, target_ids, watermark=new_watermark, advance_watermark=advance_watermark, summaries=summaries)
+            log.info("Session ID: %s (pass it to scrape_ouedkniss to resume after a crash)", journal.session_id)
 
-        # Step 3: Collect full data and download images
-        print("Collecting announcement details and media...")
-        all_raw_data = []
+        # Step 3: Stream details through download and transformation
+        # Each raw response is journaled, processed and spooled to disk as soon as it arrives,
+        # so memory no longer grows with the size of the run
+        log.info("Collecting announcement details and media...")
+        filename = output_filename(category_slug, shard.suffix)
+        spool = open_export(category_slug, filename)
+        media_pool = MediaDownloadPool(session, rate_limiter=shared.media_limiter)
         processed_ids = []
         
-        for i, ann_id in enumerate(target_ids):
-            print(f"Fetching {i+1}/{len(target_ids)}: ID {ann_id}")
-            raw_data = api.get_announcement_details(ann_id)
-            if not raw_data:
-                continue
-                
-            all_raw_data.append(raw_data)
+        def keep(ann_id, raw_data):
+            # Write-ahead: persist the raw response before doing anything else with it
+            journal.append(ann_id, raw_data)
+            if cache is not None:
+                cache.put(ann_id, query_hash, raw_data, category_slug)
             
-            # Sub-process: Download car/product images
-            if raw_data.get("medias"):
-                download_announcement_images(ann_id, raw_data["medias"])
+            # Sub-process: Queue car/product images; workers download them in the background
+            media_pool.submit(ann_id, raw_data.get("medias"))
+            
+            # Step 4: Transform right away; dynamic specs (e.g. "Kilométrage") are tracked by the spool
+            spool.add(processor.process_row(raw_data), raw_data.get("specs"))
+            if entities is not None:
+                entities.observe(ann_id, raw_data)
             
             # Mark as processed only if details were fetched
             processed_ids.append(ann_id)
-                
-            # Internal rate limiting between detail requests
-            time.sleep(WAIT_TIME)
-        
-        # Step 4: Metadata analysis (Detect unique technical specifications)
-        # This allows us to handle dynamic car specs like "Kilométrage" or "Brand"
-        print("Analyzing specifications for tabular alignment...")
-        all_spec_labels = processor.collect_all_specs(all_raw_data)
-        
-        # Step 5: Export to CSV
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"ouedkniss_{category_slug.replace('-', '_')}_{timestamp}.csv"
-        csv_manager = CSVManager(filename, all_spec_labels)
-        csv_manager.open()
         
-        print(f"Processing data and writing to {filename}...")
-        processed_data_list = []
-        
-        for raw_data in all_raw_data:
-            processed_data = processor.process_announcement(raw_data, all_spec_labels)
-            if processed_data:
-                processed_data_list.append(processed_data)
-        
-        written_count = csv_manager.write_rows(processed_data_list)
-        csv_manager.close()
+        try:
+            # Replay details already fetched by an interrupted run of this session
+            for ann_id, raw_data in journal.replay():
+                # Finish media that the interrupted run may not have completed
+                media_pool.submit(ann_id, raw_data.get("medias"))
+                
+                spool.add(processor.process_row(raw_data), raw_data.get("specs"))
+                if entities is not None:
+                    entities.observe(ann_id, raw_data)
+                processed_ids.append(ann_id)
+            
+            if processed_ids:
+                log.info("Replayed %d announcements from the journal.", len(processed_ids))
+                metrics.inc("journal_replayed_total", len(processed_ids))
+            
+            done_ids = set(processed_ids)
+            remaining_ids = [aid for aid in target_ids if aid not in done_ids]
+            
+            if TYPE == "SUMMARY":
+                # Rows come straight from the search results; only listings with
+                # pictures need a detail call (for their media list and specs)
+                detail_ids = []
+                for aid in remaining_ids:
+                    summary = summaries.get(aid)
+                    if summary and not (SUMMARY_DETAILS_FOR_MEDIA and summary.get("defaultMedia")):
+                        keep(aid, summary)
+                    else:
+                        detail_ids.append(aid)
+                log.info("%d rows taken from search results, %d need details.",
+                         len(remaining_ids) - len(detail_ids), len(detail_ids))
+                metrics.inc("summary_rows_total", len(remaining_ids) - len(detail_ids))
+                remaining_ids = detail_ids
+            
+            with metrics.stage("details"):
+                for i, (ann_id, raw_data) in enumerate(fetch_details(api, remaining_ids)):
+                    log.debug("Fetched %d/%d: ID %s", i + 1, len(remaining_ids), ann_id)
+                    if not raw_data:
+                        metrics.inc("details_total", result="failed")
+                        continue
+                    metrics.inc("details_total", result="ok")
+                    
+                    if TYPE == "SUMMARY":
+                        raw_data = {**summaries.get(ann_id, {}), **raw_data}
+                    keep(ann_id, raw_data)
+            
+            # Rows only carry store_id / user_id: fetch the stores and users the cache lacks
+            if entities is not None:
+                with metrics.stage("entities"):
+                    entities.resolve(api, ENTITY_FIELDS)
+            
+            # Step 5: Export to CSV, now that every spec column is known
+            log.info("Writing %d rows to %s...", spool.count, filename)
+            with metrics.stage("export"):
+                written_count = spool.export(filename)
+                if entities is not None:
+                    entities.export(filename)
+            metrics.inc("rows_written_total", written_count)
+            
+            # Let the media stage finish before the IDs are committed
+            log.info("Waiting for media downloads to finish...")
+            with metrics.stage("media_drain"):
+                media_pool.drain()
+            media_pool.print_report()
+        finally:
+            media_pool.stop()
+            spool.close()
         
         # Step 6: Commit persistence
-        # Only save IDs to tracking file AFTER successful CSV write
-        print("Updating tracking records...")
-        for aid in processed_ids:
-            save_scraped_id(TRACKING_FILE, aid)
+        # Only save IDs to the tracking store AFTER successful CSV write, in one atomic append
+        log.info("Updating tracking records...")
+        with metrics.stage("commit"):
+            scraped_ids.add_many(processed_ids)
+            
+            # Listings whose details failed are newer than the stored watermark: moving it past
+            # them would hide them from every later incremental scan
+            failed_ids = {str(aid) for aid in target_ids} - {str(aid) for aid in processed_ids}
+            if failed_ids and new_watermark is not None:
+                log.warning("Watermark kept in place: %d announcement(s) could not be fetched.", len(failed_ids))
+                request_rescan(category_slug + shard.suffix)
+            elif advance_watermark:
+                save_watermark(WATERMARK_FILE, category_slug + shard.suffix, new_watermark)
+            
+            journal.mark_committed()
+            journal.discard()
         
-        print(f"\nSuccessfully processed {written_count} announcements.")
+        log.info("Successfully processed %d announcements.", written_count)
         return filename
         
     except Exception as e:
-        print(f"Critical Error in scraping flow: {e}")
+        log.exception("Critical Error in scraping flow: %s", e)
+        if journal.exists():
+            log.error("Progress is journaled. Resume with session ID: %s", journal.session_id)
         return None
+    
+    finally:
+        journal.close()
+        if owns_resources:
+            shared.close()
+            write_run_metrics(journal.session_id, category_slug, shard)
+            if metrics_server:
+                metrics_server.shutdown()
+
+
+def warn_open_sessions(current_session_id=None, shard=None):
+    # Journals of the other shards running alongside are open too: only report this shard's own
+    suffix = shard.suffix if shard else ""
+    for open_session in list_open_sessions():
+        if open_session != current_session_id and suffix in open_session:
+            log.warning("Note: session '%s' was interrupted and can be resumed.", open_session)
+
+
+def scrape_categories(categories=CATEGORIES, concurrency=SCHEDULER_CONCURRENCY, shard: Shard = None) -> dict:
+    """
+    Scrapes several categories in one process.
+    The HTTP pool, tracking store, raw cache, rate limiter and circuit breaker are loaded
+    once and shared. The scans and detail fetches of the running categories interleave
+    under the one limiter, each category getting a share of the request slots proportional
+    to its priority; with more categories than `concurrency`, higher priorities start first.
+    
+    Args:
+        categories (list): [{"slug": str, "priority": int, "max_pages": int, "limit": int}].
+                           Only "slug" is required; max_pages None scans every page.
+        concurrency (int): Number of categories scraped at the same time.
+        shard (Shard, optional): The part of the ID space this process fetches.
+    
+    Returns:
+        dict: {category_slug: output filename, or None if nothing was exported}
+    """
+    shard = shard or Shard()
+    metrics.reset()
+    metrics_server = serve_metrics(shard)
+    run_id = f"schedule{shard.suffix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    categories = sorted(categories, key=lambda category: category.get("priority", 1), reverse=True)
+    slugs = [category["slug"] for category in categories]
+    
+    warn_open_sessions(shard=shard)
+    shared = SharedResources()
+    fair_share = FairShareLimiter(shared.rate_limiter)
+    
+    def run(category):
+        slug = category["slug"]
+        return scrape_ouedkniss(slug, category.get("max_pages"), shared=shared,
+                                rate_limiter=fair_share.share(slug, category.get("priority", 1)),
+                                limit=category.get("limit", LIMIT_PER_RUN), shard=shard)
+    
+    log.info("Scheduling %d categories, %d at a time: %s", len(slugs), concurrency, ", ".join(slugs))
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = dict(zip(slugs, executor.map(run, categories)))
+    finally:
+        shared.close()
+        write_run_metrics(run_id, ",".join(slugs), shard)
+        if metrics_server:
+            metrics_server.shutdown()
+    
+    for slug, filename in results.items():
+        log.info("  %s: %s", slug, filename or "no new data")
+    return results
+
+
+
+def export_from_cache(category_slug: str) -> str:
+    """
+    Offline re-export: rebuilds a category CSV from the raw response cache alone,
+    using the current mappings in process.py. No API request is made.
+    
+    Args:
+        category_slug (str): The OuedKniss category identifier.
+    
+    Returns:
+        str: The filename of the generated CSV, or None if the cache holds nothing for it.
+    """
+    cache = RawResponseCache()
+    processor = DataProcessor()
+    filename = output_filename(category_slug)
+    spool = open_export(category_slug, filename)
+    # Stores and users come from the entity cache alone, expired entries included: nothing is fetched offline
+    entity_cache = EntityCache() if ENTITY_TABLES else None
+    entities = EntityResolver(entity_cache, ENTITY_TABLES, ignore_ttl=True) if entity_cache is not None else None
+    # Responses of any earlier query that selected every field these columns need
+    query_hashes = {get_query_hash(ANNOUNCEMENT_FIELDS), *cache.covering_queries(export_paths(TYPE))}
+    
+    try:
+        log.info("Rebuilding %s from %s (%d queries)...", category_slug, RAW_CACHE_FILE, len(query_hashes))
+        for raw_data in cache.iter_latest(category_slug, query_hashes):
+            spool.add(processor.process_row(raw_data), raw_data.get("specs"))
+            if entities is not None:
+                entities.observe(raw_data.get("id"), raw_data)
+        
+        if not spool.count:
+            log.warning("No cached responses found for this category and extraction mode.")
+            return None
+        
+        log.info("Writing %d rows to %s...", spool.count, filename)
+        spool.export(filename)
+        if entities is not None:
+            entities.export(filename)
+        return filename
+    finally:
+        spool.close()
+        cache.close()
+        if entity_cache is not None:
+            entity_cache.close()
@@ -6,6 +6,11 @@ Adjust these values to control the scraper's behavior, rate limiting, and extrac
 # The GraphQL endpoint for OuedKniss
 API_URL = "https://api.ouedkniss.com/graphql"
 
+# Automatic persisted queries: send the SHA-256 hash of each query text instead of the
+# multi-kilobyte text itself. The full text is only sent when the server doesn't know the hash
+# yet (it registers it); a server without persisted-query support gets plain requests again.
+PERSISTED_QUERIES = False
+
 
 # Headers to mimic a real browser session and avoid bot detection
 HEADER = {
@@ -16,18 +21,159 @@ HEADER = {
 # Extraction settings
 COUNT= 60 # Number of items per page (60 is the API maximum)
 TRIES=3 # Number of retry attempts for failed network requests
-WAIT_TIME_RETRY=3 # Seconds to wait between retry attempts
+WAIT_TIME_RETRY=3 # Base delay for retries; doubles per attempt with random jitter (or follows Retry-After)
+RETRY_MAX_DELAY = 60 # Upper bound on a single retry delay, including Retry-After
 WAIT_TIME= 0.5 # Delay between consecutive requests (Recommended: 0.2 - 0.5s to avoid IP blocking)
 
+# Connection Pooling (shared by the API client and the image downloader)
+POOL_CONNECTIONS = 4 # Number of distinct hosts kept in the pool cache
+POOL_MAXSIZE = 12 # Keep-alive connections kept per host (should be >= MAX_WORKERS * SCHEDULER_CONCURRENCY: categories share the session)
+SEARCH_TIMEOUT = 15 # Seconds before a search page request times out
+DETAIL_TIMEOUT = 10 # Seconds before a detail request times out
+MEDIA_TIMEOUT = 15 # Seconds before an image download times out
+
+# JSON decoding of API responses (and encoding of the journal and raw cache)
+JSON_BACKEND = "AUTO" # "AUTO" = orjson when installed (pip install orjson), else the standard library; "ORJSON" or "STDLIB" to force one
+
+# Media Download Stage (runs alongside detail fetching)
+MEDIA_WORKERS = 4 # Threads downloading images in parallel
+MEDIA_REQUESTS_PER_SECOND = 8 # Per-host budget for the image CDN, separate from the API budget
+MEDIA_QUEUE_SIZE = 100 # Listings waiting for download before detail fetching pauses
+
 # Extraction Mode:
-# "MINI" = Essential fields only (faster, less bandwidth)
-# "ALL"  = Full details including all technical specifications (slower, comprehensive)
+# "MINI"    = Essential fields only (faster, less bandwidth)
+# "ALL"     = Full details including all technical specifications (slower, comprehensive)
+# "SUMMARY" = Title, price, city... straight from search results (~60 listings per request)
 TYPE= "ALL" 
 
+# Export (and fetch) only these columns of the TYPE mode, e.g. ["title", "price", "city", "created_at"].
+# The detail query is generated from them, so unused fields are never downloaded.
+# None = every column of the mode (see MODE_COLUMNS in process.py). "id" is always kept.
+OUTPUT_COLUMNS = None
+
+# SUMMARY mode only: fetch details (full media list + specs) for listings that have pictures.
+# False exports every listing from search results alone, with no detail calls at all.
+SUMMARY_DETAILS_FOR_MEDIA = False
+
+# Output Backend
+# "CSV"    = A new ouedkniss_<category>_<timestamp>.csv per run
+# "SQLITE" = Upsert every run into one indexed database (SQLITE_FILE)
+OUTPUT = "CSV"
+SQLITE_FILE = "ouedkniss.sqlite3"
+
+# CSV only: keep each category's spec columns in a persistent registry, so rows are written
+# in one pass as they arrive and column order stays the same across runs
+SPEC_REGISTRY = True
+SPEC_REGISTRY_FILE = "spec_registry.json"
+
+# Store and User Entity Cache (ALL mode)
+# Store and user details are written once per entity to their own table (SQLite) or
+# <output>_stores.csv / _users.csv, which rows join to by store_id / user_id.
+# Opt-in: it removes the store_* / user columns from the main export.
+ENTITY_CACHE = False
+ENTITY_CACHE_FILE = "entities.sqlite3"
+ENTITY_CACHE_TTL = 7 * 24 * 3600
+# Entities whose detail selection shrinks to `{ id }`. Those missing from the cache, or older than
+# ENTITY_CACHE_TTL seconds, are backfilled through one listing each, BATCH_SIZE per request: only
+# worth it for entities that repeat a lot, like dealer stores. The others (users) keep their full
+# selection and are cached straight from the detail responses, with no extra request.
+ENTITY_CACHE_SLIM = ["store"]
+
 # Persistence and Tracking
 # This file stores IDs of already scraped announcements to prevent duplicates
 TRACKING_FILE = "scraped_ids.txt"
 
+# Compact tracking store (scraped_ids.bin / .delta / .bloom).
+# On first use it is migrated once from TRACKING_FILE, which is then left as-is.
+TRACKING_STORE = "scraped_ids"
+TRACKING_BLOOM = True # Keep a Bloom filter in front of the sorted ID array for fast "new ID" checks
+TRACKING_COMPACT_THRESHOLD = 50000 # Appended IDs kept in the delta file before merging into the base
+
+# Incremental Crawling
+# When enabled, each category remembers the newest refreshedAt it has seen and
+# stops scanning once pages contain only listings that were already covered.
+INCREMENTAL = True
+WATERMARK_FILE = "watermarks.json"
+INCREMENTAL_STOP_PAGES = 1 # Consecutive all-known pages required before stopping
+
+# Crash Recovery
+# Raw responses are journaled here while a session runs; pass the printed
+# session ID to scrape_ouedkniss to resume an interrupted run.
+JOURNAL_DIR = "sessions"
+
+# Raw Response Cache
+# Compressed copies of every detail response, so CSVs can be rebuilt offline
+# (python main.py --offline) after changing the mappings in process.py.
+RAW_CACHE = True
+RAW_CACHE_FILE = "raw_cache.sqlite3"
+RAW_CACHE_MAX_MB = 2048 # Oldest responses are evicted beyond this size (None = unlimited)
+
 # Limit the number of new announcements processed in a single execution
 # Set to None to process ALL new announcements found
-LIMIT_PER_RUN = 500
\ No newline at end of file
+LIMIT_PER_RUN = 500
+
+# Detail Fetching Strategy
+# "CONCURRENT" = Several detail requests in flight at once, sharing one rate budget
+# "SEQUENTIAL" = Original one-by-one loop with WAIT_TIME between requests (fallback)
+FETCH_MODE = "CONCURRENT"
+MAX_WORKERS = 4 # Number of detail requests allowed in flight simultaneously
+REQUESTS_PER_SECOND = 4 # Global request budget shared by all workers (None = unlimited)
+BATCH_SIZE = 10 # Announcements packed into one aliased GraphQL detail request (1 = no batching)
+
+# Adaptive Rate Limiting
+# The API budget starts at REQUESTS_PER_SECOND, grows while responses are healthy and is
+# cut on 429/5xx or rising latency. Retry-After pauses every worker at once.
+ADAPTIVE_RATE = True # False = keep REQUESTS_PER_SECOND fixed
+MIN_REQUESTS_PER_SECOND = 0.5
+MAX_REQUESTS_PER_SECOND = 10
+RATE_INCREASE_STEP = 0.5 # Requests/s added after RATE_INCREASE_WINDOW healthy responses in a row
+RATE_INCREASE_WINDOW = 20
+RATE_BACKOFF_FACTOR = 0.5 # Rate multiplier on 429/5xx (latency alone uses a gentler cut)
+LATENCY_BACKOFF_RATIO = 3.0 # Back off when average latency exceeds this multiple of the best seen
+
+# Circuit Breaker
+# After BREAKER_FAILURE_THRESHOLD consecutive failures all workers pause for BREAKER_COOLDOWN
+# seconds (doubling while probes keep failing). The session aborts, resumable from its journal,
+# once the API has been down for BREAKER_MAX_WAIT seconds.
+BREAKER_FAILURE_THRESHOLD = 8
+BREAKER_COOLDOWN = 30
+BREAKER_MAX_WAIT = 900
+
+# Multi-Category Scheduling (python main.py --all)
+# Categories are scraped in one process with one shared HTTP pool, tracking store and
+# request budget. When several categories wait for a request slot, each gets a share
+# proportional to its priority. max_pages / limit override the defaults per category.
+CATEGORIES = [
+    {"slug": "automobiles_vehicules", "priority": 3, "max_pages": 10},
+    {"slug": "telephones", "priority": 1, "max_pages": 5},
+    {"slug": "informatique", "priority": 1, "max_pages": 5, "limit": 200},
+]
+SCHEDULER_CONCURRENCY = 3 # Categories scraped at the same time
+
+# Sharding
+# Splits the ID space between processes or machines; each one fetches only the IDs of its own
+# shard. Override per process with `python main.py --shard INDEX/COUNT`, or run every shard
+# locally with `python main.py --shards COUNT`. Local shards split the request budgets of this
+# host (REQUESTS_PER_SECOND, MEDIA_REQUESTS_PER_SECOND) evenly, but each one scans every page;
+# with --shard INDEX/COUNT, meant for separate machines, every process keeps the full budgets.
+# Shard 1 of 2 with "MODULO" is the odd-ID half this machine used to take.
+SHARD_INDEX = 1
+SHARD_COUNT = 2 # 1 = no sharding
+SHARD_STRATEGY = "MODULO" # "MODULO" = id % SHARD_COUNT, "HASH" = consistent hashing (resizing moves ~1/SHARD_COUNT of the IDs)
+SHARD_VNODES = 64 # Ring points per shard with "HASH"
+
+# Page Scanning Strategy (full scans only: ignored when INCREMENTAL = True)
+# "PARALLEL"   = Once lastPage is known, fetch the page range on MAX_WORKERS threads
+# "SEQUENTIAL" = Walk pages one by one with WAIT_TIME between them (fallback)
+# "SNAPSHOT"   = Sequential, drift-tolerant full scan: each page request also re-reads the end of the
+#                previous page, so listings shifted across page boundaries by REFRESHED_AT churn are
+#                caught, and listings refreshed during the scan are collected from the top at the end
+SCAN_MODE = "PARALLEL"
+SCAN_OVERLAP = 10 # Listings re-read before each page boundary in "SNAPSHOT" mode (must divide COUNT)
+
+# Logging and Metrics
+LOG_LEVEL = "INFO" # "DEBUG" also logs every fetched ID and image, "WARNING" keeps production runs quiet
+LOG_FORMAT = "TEXT" # "TEXT" for the console, "JSON" for one structured object per line
+METRICS_DIR = "metrics" # Per-run JSON summary written as <session id>.json (None = disabled)
+METRICS_PROM_FILE = "metrics/ouedkniss.prom" # Prometheus text file, e.g. for node_exporter's textfile collector (None = disabled)
+METRICS_PORT = None # Serve Prometheus metrics on http://127.0.0.1:<port>/metrics during a run (None = disabled)
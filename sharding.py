@@ -0,0 +1,121 @@
+import os
+import bisect
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from settings import SHARD_INDEX, SHARD_COUNT, SHARD_STRATEGY, SHARD_VNODES
+from log import get_logger
+
+"""
+ID-Space Sharding.
+Splits the announcement IDs of a category between processes or machines: each one runs
+as shard `index` out of `count` and only fetches the IDs that fall in its shard.
+"MODULO" is the plain `id % count` split; "HASH" places IDs on a consistent-hash ring,
+so changing the shard count only moves about 1/count of the IDs to another shard.
+"""
+
+log = get_logger("sharding")
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.blake2b(str(value).encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class Shard:
+    """
+    The slice of the ID space owned by one process. Supports `ann_id in shard`.
+
+    Args:
+        index (int): This process's shard, from 0 to count - 1.
+        count (int): Total number of shards (1 = no sharding).
+        strategy (str): "MODULO" or "HASH".
+        vnodes (int): Ring points per shard with "HASH"; more points even out shard sizes.
+    """
+    def __init__(self, index=SHARD_INDEX, count=SHARD_COUNT, strategy=SHARD_STRATEGY, vnodes=SHARD_VNODES):
+        if count < 1 or not 0 <= index < count:
+            raise ValueError(f"Invalid shard {index}/{count}: index must be between 0 and count - 1.")
+        if strategy not in ("MODULO", "HASH"):
+            raise ValueError(f"Unknown shard strategy: {strategy}")
+        self.index = index
+        self.count = count
+        self.strategy = strategy
+
+        self._points = []
+        self._owners = []
+        if strategy == "HASH" and count > 1:
+            ring = sorted((_hash(f"shard-{shard}-{vnode}"), shard) for shard in range(count) for vnode in range(vnodes))
+            self._points = [point for point, _ in ring]
+            self._owners = [shard for _, shard in ring]
+
+    @classmethod
+    def parse(cls, text, strategy=SHARD_STRATEGY):
+        """
+        Builds a shard from its "index/count" notation, e.g. "1/4".
+        """
+        try:
+            index, count = (int(part) for part in text.split("/"))
+        except ValueError:
+            raise ValueError(f"Invalid shard '{text}', expected INDEX/COUNT (e.g. 0/4).")
+        return cls(index, count, strategy)
+
+    def owner(self, ann_id):
+        """
+        Returns:
+            int: Index of the shard responsible for `ann_id`.
+        """
+        if self.count == 1:
+            return 0
+        if self.strategy == "MODULO":
+            return int(ann_id) % self.count
+        position = bisect.bisect(self._points, _hash(int(ann_id))) % len(self._points)
+        return self._owners[position]
+
+    def __contains__(self, ann_id):
+        return self.count == 1 or self.owner(ann_id) == self.index
+
+    @property
+    def suffix(self):
+        """
+        Tag keeping per-shard files (CSV, journal, watermark, metrics) apart, "" when unsharded.
+        """
+        return f"_shard{self.index}of{self.count}" if self.count > 1 else ""
+
+    def tag(self, filename):
+        """
+        Inserts the shard suffix before the extension: "metrics/run.prom" -> "metrics/run_shard0of4.prom".
+        """
+        root, extension = os.path.splitext(filename)
+        return f"{root}{self.suffix}{extension}"
+
+    def __str__(self):
+        return f"{self.index}/{self.count}"
+
+
+def _run_shard(category_slug, max_pages, index, count, strategy):
+    # Imported here: each shard is a fresh process that loads the scraper itself
+    from scraper import scrape_ouedkniss
+    return scrape_ouedkniss(category_slug, max_pages, shard=Shard(index, count, strategy), rate_share=1 / count)
+
+
+def launch_shards(category_slug, max_pages=None, count=SHARD_COUNT, strategy=SHARD_STRATEGY):
+    """
+    Runs every shard of a category as a local process and waits for all of them.
+    The shards share the tracking store, watermark file, spec registry and SQLite output
+    through file locks and WAL; each writes its own CSV and journal.
+    They also share this host's IP, so each one gets 1 / count of the API and CDN request
+    budgets. Every shard still scans the search pages itself: the scan costs count times
+    the page requests, within that split budget.
+
+    Args:
+        category_slug (str): The OuedKniss category identifier.
+        max_pages (int, optional): Limit on how many pages each shard scans.
+        count (int): Number of shard processes.
+        strategy (str): "MODULO" or "HASH".
+
+    Returns:
+        dict: {"index/count": output filename, or None if the shard exported nothing}
+    """
+    log.info("Launching %d shard processes for %s (%s)...", count, category_slug, strategy)
+    with ProcessPoolExecutor(max_workers=count) as executor:
+        futures = {f"{index}/{count}": executor.submit(_run_shard, category_slug, max_pages, index, count, strategy)
+                   for index in range(count)}
+        return {shard: future.result() for shard, future in futures.items()}
@@ -1,11 +1,12 @@
 import os
-from settings import TRACKING_FILE
+from settings import TRACKING_STORE
+from id_store import ScrapedIDStore
 
 """
-Sync Downloads → scraped_ids.txt
+Sync Downloads → tracking store
 
 Scans the 'downloads/' folder for all 'announcement_<id>' subdirectories,
-extracts their IDs, and appends any missing ones to the tracking file.
+extracts their IDs, and appends any missing ones to the tracking store.
 This is useful for recovering state after a crash or manual download session.
 """
 
@@ -41,38 +42,9 @@ def get_ids_from_downloads(downloads_dir: str) -> set:
     return found_ids
 
 
-def load_existing_ids(tracking_file: str) -> set:
-    """
-    Reads already-tracked IDs from the tracking file.
-
-    Args:
-        tracking_file (str): Path to scraped_ids.txt.
-
-    Returns:
-        set: Set of ID strings already in the file.
-    """
-    if not os.path.exists(tracking_file):
-        return set()
-    with open(tracking_file, 'r', encoding='utf-8') as f:
-        return set(line.strip() for line in f if line.strip())
-
-
-def append_new_ids(tracking_file: str, new_ids: set):
-    """
-    Appends new IDs to the tracking file, one per line.
-
-    Args:
-        tracking_file (str): Path to scraped_ids.txt.
-        new_ids (set): IDs to append.
-    """
-    with open(tracking_file, 'a', encoding='utf-8') as f:
-        for ann_id in sorted(new_ids, key=lambda x: int(x)):
-            f.write(f"{ann_id}\n")
-
-
 if __name__ == "__main__":
     print("=" * 50)
-    print("  Downloads → scraped_ids.txt Sync Tool")
+    print("  Downloads → Tracking Store Sync Tool")
     print("=" * 50)
 
     # Step 1: Scan downloads folder
@@ -84,27 +56,29 @@ if __name__ == "__main__":
         print("\nNothing to sync. Exiting.")
         exit(0)
 
-    # Step 2: Load existing tracked IDs
-    print(f"\n[2] Loading existing IDs from '{TRACKING_FILE}'...")
-    existing_ids = load_existing_ids(TRACKING_FILE)
-    print(f"    {len(existing_ids)} IDs already tracked.")
+    # Step 2: Open the tracking store
+    print(f"\n[2] Opening tracking store '{TRACKING_STORE}'...")
+    store = ScrapedIDStore()
+    print(f"    {len(store)} IDs already tracked.")
 
     # Step 3: Compute the difference
-    new_ids = downloaded_ids - existing_ids
-    already_tracked = downloaded_ids & existing_ids
+    new_ids = {ann_id for ann_id in downloaded_ids if ann_id not in store}
+    already_tracked = downloaded_ids - new_ids
 
     print(f"\n[3] Comparison results:")
     print(f"    Already in tracking file : {len(already_tracked)}")
     print(f"    New IDs to add           : {len(new_ids)}")
 
     if not new_ids:
+        store.close()
         print("\nAll downloaded IDs are already tracked. Nothing to do.")
         exit(0)
 
-    # Step 4: Append new IDs
-    print(f"\n[4] Appending {len(new_ids)} new ID(s) to '{TRACKING_FILE}'...")
-    append_new_ids(TRACKING_FILE, new_ids)
+    # Step 4: Append new IDs in one batch
+    print(f"\n[4] Appending {len(new_ids)} new ID(s) to '{TRACKING_STORE}'...")
+    store.add_many(sorted(new_ids, key=int))
+    store.close()
 
-    print(f"\n✅ Done! {len(new_ids)} ID(s) added to '{TRACKING_FILE}'.")
+    print(f"\n✅ Done! {len(new_ids)} ID(s) added to '{TRACKING_STORE}'.")
     print("   These announcements will be skipped in future scraping sessions.")
     print("=" * 50)
@@ -0,0 +1,54 @@
+import os
+import sys
+import json
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "benchmarks")]
+import pytest
+
+import fetch_api
+import scraper
+from settings import COUNT, WATERMARK_FILE
+from id_store import ScrapedIDStore
+from sharding import Shard
+from stand_in_server import StandInServer
+
+"""
+Incremental runs against a local StandInServer: listings that could not be fetched
+must not end up behind the watermark.
+"""
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    stand_in = StandInServer(total=3 * COUNT, latency=0, media_count=0)
+    monkeypatch.setattr(fetch_api, "API_URL", stand_in.start())
+    monkeypatch.setattr(fetch_api, "WAIT_TIME", 0)
+    monkeypatch.setattr(scraper, "WAIT_TIME", 0)
+    yield stand_in
+    stand_in.stop()
+
+
+def test_failed_details_are_fetched_by_the_next_run(server, monkeypatch):
+    fetch_details = scraper.fetch_details
+
+    def every_tenth_fails(api, target_ids):
+        for i, (ann_id, raw_data) in enumerate(fetch_details(api, target_ids)):
+            yield ann_id, None if i % 10 == 0 else raw_data
+
+    monkeypatch.setattr(scraper, "fetch_details", every_tenth_fails)
+    assert scraper.scrape_ouedkniss("automobiles_vehicules", shard=Shard(0, 1))
+    with open(WATERMARK_FILE, 'r', encoding='utf-8') as f:
+        assert json.load(f)["automobiles_vehicules"].get("rescan")
+
+    monkeypatch.setattr(scraper, "fetch_details", fetch_details)
+    assert scraper.scrape_ouedkniss("automobiles_vehicules", shard=Shard(0, 1))
+    with open(WATERMARK_FILE, 'r', encoding='utf-8') as f:
+        assert not json.load(f)["automobiles_vehicules"].get("rescan")
+
+    scraped_ids = ScrapedIDStore()
+    try:
+        assert all(str(ann_id) in scraped_ids for ann_id in server.ids)
+    finally:
+        scraped_ids.close()
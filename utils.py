@@ -1,273 +1,294 @@
 import os
+import json
+import hashlib
+from functools import lru_cache
 from settings import COUNT
+from file_lock import FileLock
 
 """
 Utility functions for OuedKniss API payloads and persistence.
 """
 
-def get_payload_search(category_slug, page):
+# Listing fields requested directly from SearchQuery in "SUMMARY" mode,
+# so a whole page of 60 listings is exported from a single request
+SEARCH_FIELDS_SUMMARY = """
+                        title
+                        slug
+                        price
+                        pricePreview
+                        priceUnit
+                        priceType
+                        createdAt: refreshedAt
+                        cities {
+                            name
+                            region {
+                                name
+                            }
+                        }
+                        category {
+                            slug
+                        }
+                        defaultMedia(size: MEDIUM) {
+                            mediaUrl
+                        }
+"""
+
+def get_search_filter(category_slug, page, count=COUNT):
+    """
+    The SearchFilterInput of one category results page, most recently refreshed first.
+    """
+    return {
+        "categorySlug": category_slug,
+        "origin": None,
+        "connected": False,
+        "delivery": None,
+        "regionIds": [],
+        "cityIds": [],
+        "priceRange": [None, None],
+        "exchange": None,
+        "hasPictures": False,
+        "hasPrice": False,
+        "priceUnit": None,
+        "fields": [],
+        "page": page,
+        "orderByField": {"field": "REFRESHED_AT"},
+        "count": count
+    }
+
+def get_payload_search(category_slug, page, summary=False):
     """
     Constructs the GraphQL payload for searching announcements.
     
     Args:
         category_slug (str): The slug of the category to search.
         page (int): The page number to fetch.
+        summary (bool): Also select the listing summary fields (SUMMARY mode).
         
     Returns:
         dict: The GraphQL request payload.
     """
+    summary_fields = SEARCH_FIELDS_SUMMARY.rstrip() if summary else ""
     return {
         "operationName": "SearchQuery",
         "variables": {
             "q": None,
-            "filter": {
-                "categorySlug": category_slug,
-                "origin": None,
-                "connected": False,
-                "delivery": None,
-                "regionIds": [],
-                "cityIds": [],
-                "priceRange": [None, None],
-                "exchange": None,
-                "hasPictures": False,
-                "hasPrice": False,
-                "priceUnit": None,
-                "fields": [],
-                "page": page,
-                "orderByField": {"field": "REFRESHED_AT"},
-                "count": COUNT
-            }
+            "filter": get_search_filter(category_slug, page)
+        },
+        "query": f"""
+        query SearchQuery($q: String, $filter: SearchFilterInput) {{
+            search(q: $q, filter: $filter) {{
+                announcements {{
+                    data {{
+                        id
+                        refreshedAt{summary_fields}
+                    }}
+                    paginatorInfo {{
+                        lastPage
+                        hasMorePages
+                    }}
+                }}
+            }}
+        }}
+        """
+    }
+
+def get_payload_search_overlap(category_slug, page, overlap, summary=False):
+    """
+    Constructs a search payload that also re-reads the last `overlap` listings of the
+    previous page (alias `previous`). Both are answered from the same state of the
+    results, so a shift across the page boundary shows up as changed IDs there.
+    
+    Args:
+        category_slug (str): The slug of the category to search.
+        page (int): The page number to fetch (2 or more).
+        overlap (int): Listings re-read before the boundary; must divide COUNT.
+        summary (bool): Also select the listing summary fields (SUMMARY mode).
+        
+    Returns:
+        dict: The GraphQL request payload.
+    """
+    summary_fields = SEARCH_FIELDS_SUMMARY.rstrip() if summary else ""
+    return {
+        "operationName": "SearchQueryOverlap",
+        "variables": {
+            "q": None,
+            "filter": get_search_filter(category_slug, page),
+            # With `overlap` listings per page, page (page - 1) * COUNT / overlap ends where the previous page ends
+            "previous": get_search_filter(category_slug, (page - 1) * COUNT // overlap, overlap)
         },
-        "query": """
-        query SearchQuery($q: String, $filter: SearchFilterInput) {
-            search(q: $q, filter: $filter) {
-                announcements {
-                    data {
+        "query": f"""
+        query SearchQueryOverlap($q: String, $filter: SearchFilterInput, $previous: SearchFilterInput) {{
+            search(q: $q, filter: $filter) {{
+                announcements {{
+                    data {{
                         id
-                    }
-                    paginatorInfo {
+                        refreshedAt{summary_fields}
+                    }}
+                    paginatorInfo {{
                         lastPage
                         hasMorePages
-                    }
-                }
-            }
-        }
+                    }}
+                }}
+            }}
+            previous: search(q: $q, filter: $previous) {{
+                announcements {{
+                    data {{
+                        id
+                        refreshedAt{summary_fields}
+                    }}
+                }}
+            }}
+        }}
         """
     }
 
-def get_payload_post_all(ann_id):
+# Detail field selections are generated from the exported columns (see query_builder.py)
+def get_payload_post(ann_id, fields):
     """
-    Constructs a comprehensive GraphQL payload to fetch all details of an announcement.
-    Includes technical specs, location, user info, and media.
+    Constructs the GraphQL payload fetching the details of one announcement.
     
     Args:
         ann_id (str): The ID of the announcement.
+        fields (str): The field selection (see query_builder.detail_fields).
     """
     return {
         "operationName": "AnnouncementGet",
         "variables": {"id": str(ann_id)},
-        "query": """
-        query AnnouncementGet($id: ID!) {
-            announcement: announcementDetails(id: $id) {
-                id
-                reference
-                title
-                slug
-                description
-                orderExternalUrl
-                createdAt: refreshedAt
-                price
-                pricePreview
-                oldPrice
-                oldPricePreview
-                priceType
-                exchangeType
-                priceUnit
-                hasDelivery
-                deliveryType
-                hasPhone
-                hasEmail
-                quantity
-                status
-                street_name
-                category {
-                    id
-                    slug
-                    name
-                    deliveryType
-                    parentTree {
-                        id
-                        name
-                        slug
-                        __typename
-                    }
-                    __typename
-                }
-                defaultMedia(size: ORIGINAL) {
-                    mediaUrl
-                    mimeType
-                    thumbnail
-                    __typename
-                }
-                medias(size: LARGE) {
-                    mediaUrl
-                    mimeType
-                    thumbnail
-                    __typename
-                }
-                categories {
-                    id
-                    name
-                    slug
-                    parentId
-                    __typename
-                }
-                specs {
-                    specification {
-                        label
-                        codename
-                        type
-                        __typename
-                    }
-                    value
-                    valueText
-                    __typename
-                }
-                user {
-                    id
-                    username
-                    displayName
-                    avatarUrl
-                    __typename
-                }
-                isFromStore
-                store {
-                    id
-                    name
-                    slug
-                    description
-                    imageUrl
-                    url
-                    followerCount
-                    viewAsStore
-                    announcementsCount
-                    status
-                    locations {
-                        location {
-                            address
-                            region {
-                                slug
-                                name
-                                __typename
-                            }
-                            __typename
-                        }
-                        __typename
-                    }
-                    categories {
-                        name
-                        slug
-                        __typename
-                    }
-                    __typename
-                }
-                cities {
-                    id
-                    name
-                    region {
-                        id
-                        name
-                        slug
-                        __typename
-                    }
-                    __typename
-                }
-                isCommentEnabled
-                noAdsense
-                variants {
-                    id
-                    hash
-                    specifications {
-                        specification {
-                            codename
-                            label
-                            __typename
-                        }
-                        valueText
-                        value
-                        mediaUrl
-                        __typename
-                    }
-                    price
-                    oldPrice
-                    pricePreview
-                    oldPricePreview
-                    quantity
-                    __typename
-                }
-                showAnalytics
-                messengerLink
-                __typename
-            }
-        }
+        "query": f"""
+        query AnnouncementGet($id: ID!) {{
+            announcement: announcementDetails(id: $id) {{{fields}            }}
+        }}
         """
     }
 
-def load_scraped_ids(filename):
+# Automatic persisted queries (Apollo protocol, see PERSISTED_QUERIES in settings.py)
+PERSISTED_QUERY_NOT_FOUND = "PERSISTED_QUERY_NOT_FOUND"
+PERSISTED_QUERY_NOT_SUPPORTED = "PERSISTED_QUERY_NOT_SUPPORTED"
+
+@lru_cache(maxsize=64)
+def get_query_sha256(query):
+    """
+    SHA-256 of the exact query text, as the server computes it. Cached: a run only
+    sends a handful of distinct query texts.
+    """
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+def get_persisted_payload(payload, register=False):
+    """
+    Turns a GraphQL payload into a persisted-query request: the query text is replaced
+    by its SHA-256 hash.
+    
+    Args:
+        payload (dict): A payload from get_payload_search / get_payload_post / get_payload_post_batch.
+        register (bool): Send the full text along with the hash, so the server stores it.
+    
+    Returns:
+        dict: The request payload.
+    """
+    persisted = {
+        "operationName": payload["operationName"],
+        "variables": payload["variables"],
+        "extensions": {"persistedQuery": {"version": 1, "sha256Hash": get_query_sha256(payload["query"])}},
+    }
+    if register:
+        persisted["query"] = payload["query"]
+    return persisted
+
+def get_persisted_query_error(content):
+    """
+    Tells whether the server rejected a hash-only request.
+    Regular responses never mention the error codes, so they are not decoded twice.
+    
+    Args:
+        content (bytes): The raw response body.
+    
+    Returns:
+        str: PERSISTED_QUERY_NOT_FOUND, PERSISTED_QUERY_NOT_SUPPORTED, or None.
+    """
+    if b"PERSISTED_QUERY_NOT" not in content and b"PersistedQueryNot" not in content:
+        return None
+    try:
+        errors = json.loads(content).get("errors") or []
+    except (ValueError, AttributeError):
+        return None
+    for error in errors:
+        code = (error.get("extensions") or {}).get("code")
+        message = error.get("message")
+        if PERSISTED_QUERY_NOT_FOUND in (code, message) or message == "PersistedQueryNotFound":
+            return PERSISTED_QUERY_NOT_FOUND
+        if PERSISTED_QUERY_NOT_SUPPORTED in (code, message) or message == "PersistedQueryNotSupported":
+            return PERSISTED_QUERY_NOT_SUPPORTED
+    return None
+
+def get_query_hash(fields):
+    """
+    Short stable hash of a detail field selection, used to key cached responses
+    so that entries fetched with a different query are never mixed up.
+    """
+    normalized = " ".join(fields.split())
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()[:16]
+
+def load_watermarks(filename):
     """
-    Reads already processed announcement IDs from a persistence file.
+    Reads the per-category incremental crawl watermarks.
     
     Args:
-        filename (str): Path to the tracking file.
+        filename (str): Path to the watermark file.
         
     Returns:
-        set: A set of strings containing announcement IDs.
+        dict: {category_slug: {"refreshed_at": str, "ids": list}}
     """
     if not os.path.exists(filename):
-        return set()
+        return {}
     with open(filename, 'r', encoding='utf-8') as f:
-        return set(line.strip() for line in f if line.strip())
+        return json.load(f)
 
-def save_scraped_id(filename, ann_id):
+def save_watermark(filename, category_slug, watermark):
     """
-    Persists a successfully scraped ID to the tracking file.
+    Stores the watermark of one category, replacing the file atomically.
     
     Args:
-        filename (str): Path to the tracking file.
-        ann_id (str): The ID to save.
+        filename (str): Path to the watermark file.
+        category_slug (str): The category the watermark belongs to.
+        watermark (dict): {"refreshed_at": str, "ids": list}
     """
-    with open(filename, 'a', encoding='utf-8') as f:
-        f.write(f"{ann_id}\n")
+    # Categories and shards scraped concurrently share the file: read-modify-write one at a time
+    with FileLock(f"{filename}.lock"):
+        watermarks = load_watermarks(filename)
+        watermarks[category_slug] = watermark
+        
+        temp_name = f"{filename}.tmp"
+        with open(temp_name, 'w', encoding='utf-8') as f:
+            json.dump(watermarks, f, indent=2)
+        os.replace(temp_name, filename)
 
-def get_payload_post_mini(ann_id):
+def get_payload_post_batch(ann_ids, fields):
     """
-    Constructs a lightweight GraphQL payload for basic announcement details.
+    Constructs a single GraphQL payload fetching several announcements at once.
+    Each ID gets its own alias (a0, a1, ...) and the field selection is sent
+    only once as a fragment, so N announcements cost one round trip.
     
     Args:
-        ann_id (str): The ID of the announcement.
+        ann_ids (list): The announcement IDs, in the order of their aliases.
+        fields (str): The field selection (see query_builder.detail_fields).
+        
+    Returns:
+        dict: The GraphQL request payload. Alias `a<i>` maps to `ann_ids[i]`.
     """
+    variables = {f"id{i}": str(ann_id) for i, ann_id in enumerate(ann_ids)}
+    declarations = ", ".join(f"$id{i}: ID!" for i in range(len(ann_ids)))
+    selections = "\n".join(
+        f"            a{i}: announcementDetails(id: $id{i}) {{ ...AnnouncementFields }}"
+        for i in range(len(ann_ids))
+    )
+    
     return {
-        "operationName": "AnnouncementGet",
-        "variables": {"id": str(ann_id)},
-        "query": """
-        query AnnouncementGet($id: ID!) {
-            announcement: announcementDetails(id: $id) {
-                reference
-                title
-                description
-                pricePreview
-                priceUnit
-                createdAt: refreshedAt
-                specs {
-                    specification {
-                        label
-                    }
-                    valueText
-                }
-                cities {
-                    name
-                }
-            }
-        }
+        "operationName": "AnnouncementGetBatch",
+        "variables": variables,
+        "query": f"""
+        query AnnouncementGetBatch({declarations}) {{
+{selections}
+        }}
+        fragment AnnouncementFields on Announcement {{{fields}        }}
         """
     }
\ No newline at end of file